@@ -0,0 +1,471 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+# The module name has dashes, so it is loaded from its path. It is also
+# registered in sys.modules so the process pools can pickle its functions
+here = os.path.dirname(os.path.abspath(__file__))
+spec = importlib.util.spec_from_file_location(
+    'PESU_MI', os.path.join(here, 'src', 'PESU-MI_0316_1286_2057.py'))
+mi = importlib.util.module_from_spec(spec)
+sys.modules['PESU_MI'] = mi
+spec.loader.exec_module(mi)
+
+
+def weather():
+    outlook = 'overcast,overcast,overcast,overcast,rainy,rainy,rainy,rainy,rainy,sunny,sunny,sunny,sunny,sunny'.split(',')
+    temp = 'hot,cool,mild,hot,mild,cool,cool,mild,mild,hot,hot,mild,cool,mild'.split(',')
+    humidity = 'high,normal,high,normal,high,normal,normal,normal,high,high,high,high,normal,normal'.split(',')
+    windy = 'FALSE,TRUE,TRUE,FALSE,FALSE,FALSE,TRUE,FALSE,TRUE,FALSE,TRUE,FALSE,FALSE,TRUE'.split(',')
+    play = 'yes,yes,yes,yes,yes,yes,no,yes,no,no,no,no,yes,yes'.split(',')
+    dataset ={'outlook':outlook,'temp':temp,'humidity':humidity,'windy':windy,'play':play}
+    return pd.DataFrame(dataset,columns=['outlook','temp','humidity','windy','play'])
+
+
+def random_dataset(rows=3000, seed=0, missing=False):
+    # Categorical columns c0..c4 with 2 to 6 values, the target y depends
+    # on c1 with 30% noise. With missing, 10% of c2 is NaN
+    rng = np.random.default_rng(seed)
+    data = {'c'+str(i): rng.choice(list('abcdef')[:i+2], rows) for i in range(5)}
+    data['y'] = np.where(rng.random(rows) < 0.3, 'p', np.where(data['c1'] == 'a', 'q', 'r'))
+    df = pd.DataFrame(data)
+    if missing:
+        df.loc[rng.random(rows) < 0.1, 'c2'] = np.nan
+    return df
+
+
+def naive_entropy_of_attribute(df, attribute):
+    # The entropy of an attribute as the original loops computed it, rows
+    # with a missing value count in the number of rows only
+    target = df.columns[-1]
+    entropy = 0
+    for value in df[attribute].dropna().unique():
+        subset = df[df[attribute] == value][target]
+        p = subset.value_counts(normalize=True).to_numpy()
+        entropy += len(subset) / len(df) * -(p * np.log2(p)).sum()
+    return entropy
+
+
+def close(a, b, tolerance=1e-9):
+    return abs(a - b) <= tolerance
+
+
+def close_gains(a, b, tolerance=1e-9):
+    return a.keys() == b.keys() and all(close(a[k], b[k], tolerance) for k in a)
+
+
+def same_selection(a, b):
+    return close_gains(a[0], b[0]) and a[1] == b[1]
+
+
+def check(number, function, condition):
+    try:
+        passed = bool(condition())
+    except Exception:
+        passed = False
+    if passed:
+        print("Test Case " + str(number) + " for the function " + function + " PASSED")
+    else:
+        print("Test Case " + str(number) + " for the function " + function + " FAILED")
+    return passed
+
+
+def test_case():
+    df = weather()
+    data = random_dataset(missing=True)
+    results = []
+
+    # Single pass contingency tables give the values of the original loops
+    results.append(check(1, "get_entropy_of_attribute", lambda: all(
+        close(mi.get_entropy_of_attribute(data, col), naive_entropy_of_attribute(data, col))
+        for col in data.columns[:-1])))
+
+    results.append(check(2, "get_selected_attribute", lambda:
+        same_selection(mi.get_selected_attribute(data, batched=True), mi.get_selected_attribute(data)) and
+        mi.get_selected_attribute(df)[1] == 'outlook'))
+
+    # Every leaf of the ID3 tree is pure or out of attributes
+    def tree_fits():
+        return mi.predict(mi.build_tree(df), df) == df['play'].tolist()
+    results.append(check(3, "build_tree", tree_fits))
+
+    tree = mi.build_tree(data)
+    results.append(check(4, "build_tree", lambda:
+        mi.build_tree(data, n_jobs=2, parallel_threshold=200) == tree))
+
+    # The sort-once search against every midpoint evaluated directly
+    def threshold_split():
+        rng = np.random.default_rng(1)
+        numeric = pd.DataFrame({'x': rng.integers(0, 20, 400).astype(float), 'y': rng.choice(['a', 'b', 'c'], 400)})
+        best = 0.0
+        values = np.unique(numeric['x'])
+        for threshold in (values[1:] + values[:-1]) / 2:
+            left = (numeric['x'] <= threshold).map({True: 'l', False: 'r'})
+            best = max(best, mi.get_information_gain(pd.DataFrame({'s': left, 'y': numeric['y']}), 's'))
+        return close(mi.get_threshold_split(numeric, 'x')[1], best)
+    results.append(check(5, "get_threshold_split", threshold_split))
+
+    chunks = [data.iloc[i:i+500] for i in range(0, len(data), 500)]
+    results.append(check(6, "get_selected_attribute_streaming", lambda:
+        same_selection(mi.get_selected_attribute_streaming(chunks), mi.get_selected_attribute(data)) and
+        close(mi.get_entropy_of_dataset_streaming(chunks), mi.get_entropy_of_dataset(data))))
+
+    def add_remove():
+        statistics = mi.GainStatistics(data.iloc[:1000])
+        statistics.add_rows(data.iloc[1000:2000])
+        statistics.remove_rows(data.iloc[:1000])
+        return same_selection(statistics.selected_attribute(), mi.get_selected_attribute(data.iloc[1000:2000]))
+    results.append(check(7, "GainStatistics", add_remove))
+
+    encoded = mi.EncodedDataset.from_dataframe(data)
+    results.append(check(8, "EncodedDataset", lambda:
+        same_selection(mi.get_selected_attribute(encoded), mi.get_selected_attribute(data)) and
+        encoded.to_dataframe().equals(data)))
+
+    def split_scores():
+        scores = mi.get_split_scores(df, 'outlook')
+        return (close(scores['information_gain'], mi.get_information_gain(df, 'outlook')) and
+                close(scores['gain_ratio'], 0.156, 1e-3) and close(scores['gini'], 0.116, 1e-3) and
+                close(scores['chi_square'], 3.547, 1e-3) and scores['degrees_of_freedom'] == 2)
+    results.append(check(9, "get_split_scores", split_scores))
+
+    tree = mi.build_tree(data)
+    results.append(check(10, "CompiledTree", lambda:
+        mi.compile_tree(tree).predict(data) == mi.predict(tree, data)))
+
+    # The histogram gain plus its bound is never below the exact gain
+    def histogram_split():
+        rng = np.random.default_rng(2)
+        numeric = pd.DataFrame({'x': rng.normal(size=5000), 'y': rng.choice(['a', 'b', 'c'], 5000)})
+        numeric['y'] = np.where(numeric['x'] > 0.3, 'a', numeric['y'])
+        threshold, gain, bound = mi.get_histogram_split(numeric, 'x', n_bins=32)
+        return gain <= mi.get_threshold_split(numeric, 'x')[1] + 1e-12 <= gain + bound + 1e-12
+    results.append(check(11, "get_histogram_split", histogram_split))
+
+    results.append(check(12, "build_forest", lambda:
+        mi.build_forest(data, n_trees=4, random_state=0, n_jobs=2).predict(data) ==
+        mi.build_forest(data, n_trees=4, random_state=0).predict(data)))
+
+    results.append(check(13, "get_information_gains", lambda:
+        close_gains(mi.get_information_gains(data, n_threads=3), mi.get_selected_attribute(data)[0])))
+
+    # Attributes whose entropy is below the best gain cannot beat it and
+    # are skipped, the evaluated ones get their exact gains
+    def pruned_selection():
+        rng = np.random.default_rng(3)
+        rows = 2000
+        frame = pd.DataFrame({'rare': np.where(rng.random(rows) < 0.02, 'b', 'a'),
+                              'key': rng.choice(list('abcd'), rows),
+                              'noise': rng.choice(list('abc'), rows),
+                              'flag': np.where(rng.random(rows) < 0.05, 'b', 'a')})
+        frame['y'] = np.where(rng.random(rows) < 0.1, 'p', np.where(frame['key'] < 'c', 'q', 'r'))
+        gains, selected, skipped = mi.get_selected_attribute_pruned(frame)
+        exact = mi.get_selected_attribute(frame)[0]
+        return (skipped == 2 and sorted(gains) == ['key', 'noise'] and selected == 'key' and
+                close_gains(gains, {column: exact[column] for column in gains}))
+    results.append(check(14, "get_selected_attribute_pruned", pruned_selection))
+
+    results.append(check(15, "get_selected_attribute_sampled", lambda:
+        mi.get_selected_attribute_sampled(data, initial_size=500, random_state=0)[1] == 'c1' and
+        same_selection(mi.get_selected_attribute_sampled(df)[:2], mi.get_selected_attribute(df, batched=True))))
+
+    def entropy_cache():
+        cache = mi.EntropyCache(data)
+        rows = np.arange(0, len(data), 3)
+        first = cache.get_information_gain('c1', rows)
+        second = cache.get_information_gain('c1', rows)
+        return (first == second and close(first, mi.get_information_gain(data.iloc[rows], 'c1')) and
+                cache.info()['hits'] == 2)
+    results.append(check(16, "EntropyCache", entropy_cache))
+
+    # The folds are drawn as in cross_validate_selection
+    def cross_validation():
+        folds = mi.cross_validate_selection(data, k=4, random_state=0)
+        fold = np.empty(len(data), dtype=int)
+        fold[np.random.default_rng(0).permutation(len(data))] = np.arange(len(data)) % 4
+        return len(folds) == 4 and all(
+            same_selection(folds[f], mi.get_selected_attribute(data[fold != f])) for f in range(4))
+    results.append(check(17, "cross_validate_selection", cross_validation))
+
+    chunks = [data.iloc[i:i+500] for i in range(0, len(data), 500)]
+    def partitioned():
+        directory = tempfile.mkdtemp()
+        paths = []
+        for i, chunk in enumerate(chunks):
+            paths.append(os.path.join(directory, str(i) + '.csv'))
+            chunk.to_csv(paths[-1], index=False)
+        return same_selection(mi.get_selected_attribute_partitioned(paths, n_jobs=2),
+                              mi.get_selected_attribute(pd.concat([pd.read_csv(p) for p in paths])))
+    results.append(check(18, "get_selected_attribute_partitioned", partitioned))
+
+    def mutual_information():
+        matrix = mi.mutual_information_matrix(data)
+        return (close(matrix.loc['c1', 'c3'], mi.get_information_gain(data[['c3', 'c1']], 'c3')) and
+                np.allclose(matrix.to_numpy(), matrix.to_numpy().T))
+    results.append(check(19, "mutual_information_matrix", mutual_information))
+
+    # Integer weights count like duplicated rows
+    def weights():
+        counts = np.random.default_rng(3).integers(0, 4, len(data))
+        duplicated = data.loc[data.index.repeat(counts)]
+        return (same_selection(mi.get_selected_attribute(data, weights=counts), mi.get_selected_attribute(duplicated)) and
+                close(mi.get_entropy_of_dataset(data, counts), mi.get_entropy_of_dataset(duplicated)))
+    results.append(check(20, "get_selected_attribute", weights))
+
+    results.append(check(21, "entropyOfCounts", lambda:
+        close(mi.entropyOfCounts(np.array([9, 5])), 0.940285958670631) and
+        close(mi.entropyOfCounts(np.array([1 << 20, 3 << 20])), 0.811278124459133) and
+        close(mi.entropyOfCounts(np.array([0.5, 0.5])), 1.0)))
+
+    def csv_cache():
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'data.csv')
+        data.to_csv(path, index=False)
+        first = mi.load_csv_cached(path)
+        second = mi.load_csv_cached(path)
+        return (all(isinstance(codes, np.memmap) for codes in second.codes) and
+                same_selection(mi.get_selected_attribute(second), mi.get_selected_attribute(data)) and
+                first.to_dataframe().equals(second.to_dataframe()))
+    results.append(check(22, "load_csv_cached", csv_cache))
+
+    def missing_values():
+        filled = data.copy()
+        filled['c2'] = filled['c2'].fillna('missing')
+        return (close(mi.get_information_gain(data, 'c2', missing='category'), mi.get_information_gain(filled, 'c2')) and
+                close(mi.get_information_gain(data, 'c2', missing='ignore'), mi.get_information_gain(data, 'c2')))
+    results.append(check(23, "get_information_gain", missing_values))
+
+    chunks = [data.iloc[i:i+500] for i in range(0, len(data), 500)]
+    def hoeffding_tree():
+        learner = mi.HoeffdingTree.from_chunks(chunks, grace_period=200)
+        predictions = learner.predict(data)
+        # 70% is the best any classifier can do with the 30% noise
+        return (learner.tree()['attribute'] == 'c1' and
+                np.mean(np.array(predictions) == data['y'].to_numpy()) >= 0.68)
+    results.append(check(24, "HoeffdingTree", hoeffding_tree))
+
+    def profiling():
+        with mi.profiling():
+            selection = mi.get_selected_attribute(df)
+        report = mi.get_profile_report()
+        return (selection == mi.get_selected_attribute(df) and len(report['calls']) == 12 and
+                report['functions']['get_information_gain']['calls'] == 4)
+    results.append(check(25, "get_profile_report", profiling))
+
+    # A rejected removal leaves the vocabularies and tables untouched
+    def rejected_removal():
+        statistics = mi.GainStatistics(data.iloc[:1000])
+        vocabularies = [dict(vocabulary) for vocabulary in statistics.vocabularies]
+        shapes = [counts.shape for counts in statistics.counts]
+        unseen = data.iloc[:3].assign(c0='unseen', y='unseen')
+        try:
+            statistics.remove_rows(unseen)
+            return False
+        except ValueError:
+            pass
+        return (statistics.vocabularies == vocabularies and
+                [counts.shape for counts in statistics.counts] == shapes)
+    results.append(check(26, "GainStatistics", rejected_removal))
+
+    # The corners of the histogram bound are enumerated in small blocks
+    def histogram_memory():
+        rng = np.random.default_rng(4)
+        peaks = []
+        for classes in (8, 12):
+            numeric = pd.DataFrame({'x': rng.random(20000), 'y': rng.integers(0, classes, 20000)})
+            tracemalloc.start()
+            mi.get_histogram_split(numeric, 'x')
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        return max(peaks) < 20 * 1024 * 1024
+    results.append(check(27, "get_histogram_split", histogram_memory))
+
+    # A sample schedule that would never grow is rejected
+    def sample_schedule():
+        for arguments in ({'growth': 1}, {'growth': 0.5}, {'initial_size': 0}):
+            try:
+                mi.get_selected_attribute_sampled(data, **arguments)
+                return False
+            except ValueError:
+                pass
+        return mi.get_selected_attribute_sampled(data, initial_size=1, growth=1.01, random_state=0)[1] == 'c1'
+    results.append(check(28, "get_selected_attribute_sampled", sample_schedule))
+
+    # The same rows in another order share a cache entry
+    def cache_order():
+        cache = mi.EntropyCache(data)
+        rows = np.arange(0, len(data), 3)
+        first = cache.get_information_gain('c1', rows)
+        second = cache.get_information_gain('c1', rows[::-1])
+        return close(first, second) and cache.info()['hits'] == 2 and cache.info()['misses'] == 2
+    results.append(check(29, "EntropyCache", cache_order))
+
+    # Saving over a cache leaves the codes mapped from it unchanged and the
+    # new codes paired with the new vocabularies
+    encoded = mi.EncodedDataset.from_dataframe(data)
+    def cache_save():
+        directory = tempfile.mkdtemp()
+        encoded.save(directory)
+        mapped = mi.EncodedDataset.load(directory)
+        before = np.array(mapped.codes)
+        smaller = random_dataset(rows=500, seed=5)
+        mi.EncodedDataset.from_dataframe(smaller).save(directory)
+        return ((np.array(mapped.codes) == before).all() and
+                mi.EncodedDataset.load(directory).to_dataframe().equals(smaller))
+    results.append(check(30, "EncodedDataset", cache_save))
+
+    # The cache is rebuilt when the read_csv arguments change
+    def cache_arguments():
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'data.csv')
+        data.to_csv(path, index=False)
+        mi.load_csv_cached(path)
+        selected = mi.load_csv_cached(path, usecols=['c1', 'y'])
+        return list(selected.columns) == ['c1', 'y'] and mi.load_csv_cached(path).shape == data.shape
+    results.append(check(31, "load_csv_cached", cache_arguments))
+
+    # Attributes independent of the target never split a Hoeffding tree
+    def hoeffding_noise():
+        rng = np.random.default_rng(6)
+        rows = 60000
+        stream = pd.DataFrame({'n'+str(i): rng.choice(list('abcd'), rows) for i in range(5)})
+        stream.insert(0, 'a', rng.choice(list('xyz'), rows))
+        stream['y'] = np.where(rng.random(rows) < 0.3, rng.choice(['p', 'q'], rows),
+                               np.where(stream['a'] == 'x', 'p', 'q'))
+        learner = mi.HoeffdingTree.from_chunks(stream.iloc[i:i+1000] for i in range(0, rows, 1000))
+        return [learner.columns[j] for j in learner.attribute if j >= 0] == ['a']
+    results.append(check(32, "HoeffdingTree", hoeffding_noise))
+
+    # Profiling does not change what the profiled functions return
+    def profiled_behaviour():
+        unprofiled = mi.get_entropy_of_attribute(df, 'unknown')
+        with mi.profiling(trace_memory=True):
+            profiled = mi.get_entropy_of_attribute(df, 'unknown')
+        record = mi.get_profile_report()['calls'][0]
+        return profiled == unprofiled == 0 and record['distinct_values'] is None
+    results.append(check(33, "get_profile_report", profiled_behaviour))
+
+    # A mostly missing column cannot win a split, and the rows missing the
+    # split attribute still go down to a child
+    def tree_missing():
+        empty = df.assign(junk=np.nan)[['junk'] + list(df.columns)]
+        sparse = df.assign(junk=[np.nan]*13 + ['z'])[['junk'] + list(df.columns)]
+        tree = mi.build_tree(sparse)
+        learner = mi.HoeffdingTree.from_chunks([sparse] * 200, grace_period=14)
+        partly = df[['outlook', 'play']].copy()
+        partly.loc[[0, 5], 'outlook'] = np.nan
+        children = mi.build_tree(partly)['children'].values()
+        return (mi.build_tree(empty)['attribute'] == 'outlook' and tree['attribute'] == 'outlook' and
+                mi.predict(tree, sparse) == df['play'].tolist() and
+                learner.tree()['attribute'] == 'outlook' and
+                sum(child['samples'] for child in children) == len(partly))
+    results.append(check(34, "build_tree", tree_missing))
+
+    # The parallel build splits the top of the tree in the parent until
+    # every worker has a large subtree, not only the children of the root
+    def parallel_spread():
+        import concurrent.futures
+        submit = concurrent.futures.ProcessPoolExecutor.submit
+        sizes = []
+        def counting(pool, function, *args, **kwargs):
+            if function is mi.growSharedSubtree:
+                sizes.append(len(args[0]))
+            return submit(pool, function, *args, **kwargs)
+        rng = np.random.default_rng(7)
+        rows = 4000
+        frame = pd.DataFrame({'b': rng.choice(['u', 'v'], rows),
+                              'c': rng.choice(list('xyz'), rows),
+                              'd': rng.choice(list('xyz'), rows)})
+        frame['y'] = np.where(frame['b'] == 'u', frame['c'], frame['d'])
+        concurrent.futures.ProcessPoolExecutor.submit = counting
+        try:
+            tree = mi.build_tree(frame, n_jobs=4, parallel_threshold=300)
+        finally:
+            concurrent.futures.ProcessPoolExecutor.submit = submit
+        return (len(sizes) >= 4 and min(sizes) >= 300 and
+                tree == mi.build_tree(frame))
+    results.append(check(35, "build_tree", parallel_spread))
+
+    # Negative and non-finite weights are rejected instead of giving
+    # negative or NaN counts
+    def invalid_weights():
+        rejected = 0
+        for bad in (-1, np.nan, np.inf):
+            weights = np.ones(len(df))
+            weights[3] = bad
+            for function in (mi.get_entropy_of_dataset, mi.build_tree):
+                try:
+                    function(df, weights=weights)
+                except ValueError:
+                    rejected += 1
+        zero = np.ones(len(df))
+        zero[3] = 0
+        return (rejected == 6 and
+                close(mi.get_entropy_of_dataset(df, weights=zero),
+                      mi.get_entropy_of_dataset(df.drop(3))))
+    results.append(check(36, "get_entropy_of_dataset", invalid_weights))
+
+    # Every column is coded in the smallest type of its own, a high
+    # cardinality column does not widen the others, also through the
+    # cache and the parallel tree builder
+    def column_dtypes():
+        wide = data.assign(id=(np.arange(len(data)) % 300).astype(str))[['id'] + list(data.columns)]
+        encoded = mi.EncodedDataset.from_dataframe(wide)
+        directory = tempfile.mkdtemp()
+        encoded.save(directory)
+        mapped = mi.EncodedDataset.load(directory)
+        return ([codes.dtype for codes in encoded.codes] ==
+                [np.dtype(np.uint16)] + [np.dtype(np.uint8)] * data.shape[1] and
+                [codes.dtype for codes in mapped.codes] == [codes.dtype for codes in encoded.codes] and
+                encoded.to_dataframe().equals(wide) and
+                mi.build_tree(wide) ==
+                mi.build_tree(encoded, n_jobs=2, parallel_threshold=8) ==
+                mi.build_tree(mapped, n_jobs=2, parallel_threshold=8))
+    results.append(check(37, "EncodedDataset", column_dtypes))
+
+    # The fractional policy spreads the rows missing outlook over its
+    # values in proportion to the known rows (3, 5 and 4 of 12), here one
+    # yes and one no row. An unknown policy is rejected
+    def fractional_missing():
+        def H(*counts):
+            p = np.array(counts) / sum(counts)
+            return -(p * np.log2(p)).sum()
+        partly = df.copy()
+        partly.loc[[0, 9], 'outlook'] = np.nan
+        expected = (42/12 * H(39/12, 3/12) + 70/12 * H(41/12, 29/12) + 56/12 * H(28/12, 28/12)) / 14
+        rejected = 0
+        for function in (mi.get_entropy_of_attribute, mi.get_information_gain):
+            try:
+                function(partly, 'outlook', missing='drop')
+            except ValueError:
+                rejected += 1
+        try:
+            mi.get_selected_attribute(partly, batched=True, missing='drop')
+        except ValueError:
+            rejected += 1
+        return (close(mi.get_entropy_of_attribute(partly, 'outlook', missing='fractional'), expected) and
+                rejected == 3)
+    results.append(check(38, "get_entropy_of_attribute", fractional_missing))
+
+    # Profiling finds the attribute by name, weights passed by position
+    # are not mistaken for it
+    def profiled_weights():
+        weights = np.arange(1, len(df) + 1)
+        unprofiled = (mi.get_entropy_of_dataset(df, weights),
+                      mi.get_information_gain(df, 'outlook', weights))
+        with mi.profiling():
+            profiled = (mi.get_entropy_of_dataset(df, weights),
+                        mi.get_information_gain(df, 'outlook', weights))
+        attributes = [record['attribute'] for record in mi.get_profile_report()['calls']]
+        return profiled == unprofiled and attributes == [None, None, 'outlook', 'outlook']
+    results.append(check(39, "get_profile_report", profiled_weights))
+
+    return all(results)
+
+
+if __name__=="__main__":
+    sys.exit(0 if test_case() else 1)
@@ -1,40 +1,192 @@
 import numpy as np
 import pandas as pd
 import random
+import os
+import sys
+import hashlib
+import inspect
+import pickle
+import shutil
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from multiprocessing import shared_memory
 
 
-def get_entropy_of_dataset(df):
-    # gets the target column
-    target = df.loc[:, df.columns[-1]]
-    unique_values = target.unique().tolist()
+# Opt-in profiling of the entropy and gain functions. While disabled a
+# profiled function costs one extra call and flag test. While enabled
+# every call appends a record of its wall time, the rows it scanned, the
+# distinct values of the column it coded and, if memory tracing was asked
+# for, the peak bytes it allocated above what was allocated on entry.
+# Nested calls (the two entropies inside get_information_gain) get their
+# own records with a larger depth, their time and bytes are included in
+# the caller's
+_profiling = False
+_profile = {'calls': [], 'trace_memory': False}
+_profileStack = []
 
-    # number of unique values
-    uniq = len(unique_values)
 
-    target = target.tolist()
-    vals = []
-    for i in range(uniq):
-        vals.append(target.count(unique_values[i]))
-    summ = sum(vals)
-    entropy = 0
-    for i in range(uniq):
-        entropy += (-1)*(vals[i]/summ)*(np.log2(vals[i]/summ))
-    return entropy
+def enable_profiling(trace_memory=False):
+    # Start a new profile, trace_memory uses tracemalloc which slows the
+    # profiled code down noticeably and resets its peak on every call
+    global _profiling, _profile
+    _profile = {'calls': [], 'trace_memory': trace_memory}
+    _profileStack.clear()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _profile['stop_tracing'] = True
+    _profiling = True
+
+
+def disable_profiling():
+    # Stop recording, the records are kept for get_profile_report
+    global _profiling
+    _profiling = False
+    if _profile.pop('stop_tracing', False):
+        tracemalloc.stop()
+
+
+@contextmanager
+def profiling(trace_memory=False):
+    # with profiling(): ... records the calls made inside the block
+    enable_profiling(trace_memory)
+    try:
+        yield
+    finally:
+        disable_profiling()
+
+
+def distinctValues(df, attribute):
+    # None for a column the frame does not have, which the profiled
+    # functions handle themselves
+    if attribute not in df.columns:
+        return None
+    if isinstance(df, EncodedDataset):
+        return len(columnCodes(df, attribute)[1])
+    return int(df[attribute].nunique())
+
+
+def profiled(function):
+    signature = inspect.signature(function)
+
+    @wraps(function)
+    def wrapper(df, *args, **kw):
+        if not _profiling:
+            return function(df, *args, **kw)
+
+        # The attribute argument is found by name, for the functions that
+        # take one, whether it is passed by position or by keyword
+        arguments = signature.bind(df, *args, **kw).arguments
+        attribute = arguments.get('attribute')
+        record = {'function': function.__name__, 'attribute': attribute,
+                  'depth': len(_profileStack), 'rows': df.shape[0],
+                  'distinct_values': distinctValues(
+                      df, df.columns[-1] if attribute is None else attribute)}
+        tracing = _profile['trace_memory'] and tracemalloc.is_tracing()
+        if tracing:
+            # The peak is reset for every call, so the peak reached so far
+            # by the caller and then by each callee is kept on the stack
+            current, peak = tracemalloc.get_traced_memory()
+            if _profileStack:
+                _profileStack[-1] = max(_profileStack[-1], peak)
+            tracemalloc.reset_peak()
+        _profileStack.append(0)
+        start = time.perf_counter()
+        try:
+            return function(df, *args, **kw)
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            callPeak = _profileStack.pop()
+            if tracing:
+                callPeak = max(callPeak, tracemalloc.get_traced_memory()[1])
+                record['bytes_allocated'] = callPeak - current
+                if _profileStack:
+                    _profileStack[-1] = max(_profileStack[-1], callPeak)
+            _profile['calls'].append(record)
+    return wrapper
+
+
+def get_profile_report():
+    # Records of the last profile and their totals per function, the
+    # overall time only counts the outermost calls:
+    # {'calls': [record, ...],
+    #  'functions': {name: {'calls', 'seconds', 'rows',
+    #                       'peak_bytes_allocated'}},
+    #  'total_seconds': seconds}
+    functions = {}
+    total = 0.0
+    for record in _profile['calls']:
+        summary = functions.setdefault(record['function'], {
+            'calls': 0, 'seconds': 0.0, 'rows': 0,
+            'peak_bytes_allocated': 0})
+        summary['calls'] += 1
+        summary['seconds'] += record['seconds']
+        summary['rows'] += record['rows']
+        summary['peak_bytes_allocated'] = max(
+            summary['peak_bytes_allocated'], record.get('bytes_allocated', 0))
+        if record['depth'] == 0:
+            total += record['seconds']
+    return {'calls': list(_profile['calls']), 'functions': functions,
+            'total_seconds': total}
+
+
+@profiled
+def get_entropy_of_dataset(df, weights=None):
+    # Count the rows of every target value with one bincount and take the
+    # entropy of the counts
+    return entropyOfCounts(targetCounts(df, weights))
+
+
+# c * log2(c) of the integer counts below the table size, looked up
+# instead of computed for the common case of small counts
+NLOGN_TABLE_SIZE = 1 << 16
+NLOGN_TABLE = np.arange(NLOGN_TABLE_SIZE, dtype=float)
+NLOGN_TABLE[1:] *= np.log2(NLOGN_TABLE[1:])
+
+
+def nLogN(counts):
+    # c * log2(c) of every count, with 0 * log2(0) = 0
+    counts = np.asarray(counts)
+    if counts.dtype.kind in 'iu':
+        small = counts < NLOGN_TABLE_SIZE
+        if small.all():
+            return NLOGN_TABLE[counts]
+        result = np.empty(counts.shape)
+        result[small] = NLOGN_TABLE[counts[small]]
+        large = counts[~small].astype(float)
+        result[~small] = large * np.log2(large)
+        return result
+    # Weighted counts, log2(1) = 0 takes care of the zeros without a branch
+    counts = counts.astype(float)
+    return counts * np.log2(np.where(counts > 0, counts, 1))
+
+
+def rowEntropies(counts):
+    # Shared entropy kernel of all the functions: the entropy of every row
+    # (last axis) of a count array along with the row totals. With N the
+    # total of a row, H = (N log2 N - sum(c log2 c)) / N so no
+    # probabilities are formed and rows without any count get 0
+    counts = np.asarray(counts)
+    rowTotals = counts.sum(axis=-1)
+    entropies = (nLogN(rowTotals) - nLogN(counts).sum(axis=-1)) / \
+        np.where(rowTotals > 0, rowTotals, 1)
+    return entropies, rowTotals
+
+
+def entropyOfCounts(counts):
+    # Entropy of a vector of class counts
+    return float(rowEntropies(counts)[0])
 
 
 def entropyFormula(answerDict):
     valueOfAttribute_entropy = {}
 
     for value in answerDict:
-        temp = answerDict[value].values()
-        denominator = sum(temp)
-        entropy = 0
-
-        for count in temp:
-            if (count != 0):
-                entropy += -(count/denominator) * np.log2(count/denominator)
-
-        valueOfAttribute_entropy[value] = entropy
+        valueOfAttribute_entropy[value] = entropyOfCounts(
+            list(answerDict[value].values()))
 
     return valueOfAttribute_entropy
 
@@ -50,8 +202,264 @@ def avgInformationEntropy(answerDict, valueOfAttribute_entropy,
     return answer
 
 
-def get_entropy_of_attribute(df, attribute):
+def encodeColumn(column):
+    # Integer-code a column in order of first appearance (the order
+    # unique() returns). Missing values never compare equal to anything,
+    # so they get the code len(values) which the counting step drops
+    codes, uniques = pd.factorize(column)
+    codes[codes < 0] = len(uniques)
+    return codes, uniques.tolist()
+
+
+def smallestCodeType(numberOfValues):
+    # Smallest unsigned type holding the codes 0..numberOfValues, the last
+    # one being the missing value code
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if numberOfValues <= np.iinfo(dtype).max:
+            return dtype
+    return np.intp
+
+
+class EncodedDataset:
+    # Dictionary-encoded dataset: every column is stored as small unsigned
+    # integer codes indexing its vocabulary (values in order of first
+    # appearance), missing values get the code len(vocabulary). codes is
+    # the list of the columns' code arrays, each of the smallest type that
+    # fits its own vocabulary so a high-cardinality column does not widen
+    # the others. Value comparisons become integer operations and
+    # categorical string columns shrink to a byte or two per cell. All the
+    # entropy and gain functions accept it in place of a dataframe
+    def __init__(self, codes, vocabularies, columns):
+        self.codes = list(codes)
+        self.vocabularies = vocabularies
+        self.columns = pd.Index(columns)
+        self.shape = (len(self.codes[0]) if self.codes else 0,
+                      len(self.codes))
+
+    @classmethod
+    def from_dataframe(cls, df):
+        codes = []
+        vocabularies = []
+        for j in range(df.shape[1]):
+            valueCodes, values = encodeColumn(df.iloc[:, j])
+            codes.append(valueCodes.astype(smallestCodeType(len(values))))
+            vocabularies.append(values)
+        return cls(codes, vocabularies, df.columns)
+
+    def to_dataframe(self):
+        data = {}
+        for j, column in enumerate(self.columns):
+            values = np.array(self.vocabularies[j] + [np.nan], dtype=object)
+            data[column] = values[self.codes[j]]
+        return pd.DataFrame(data, columns=self.columns)
+
+    @property
+    def nbytes(self):
+        return sum(codes.nbytes for codes in self.codes)
+
+    def save(self, path, source=None):
+        # Columnar on-disk cache: a directory holding a codes directory with
+        # one .npy file per column and the columns and vocabularies pickled
+        # along with the name of the codes directory. Every save writes new
+        # codes and then atomically replaces the pickle, so a reader never
+        # pairs codes and vocabularies of different saves and the processes
+        # that memory-mapped the previous codes keep their pages, as their
+        # files are unlinked rather than overwritten. source is stored to
+        # tell what the cache was built from, see load_csv_cached
+        os.makedirs(path, exist_ok=True)
+        metadataPath = os.path.join(path, CACHE_METADATA)
+        previous = None
+        if os.path.exists(metadataPath):
+            previous = readCacheMetadata(path)['codes']
+        token = os.urandom(8).hex()
+        codesDirectory = 'codes-' + token
+        os.makedirs(os.path.join(path, codesDirectory))
+        for j, codes in enumerate(self.codes):
+            np.save(os.path.join(path, codesDirectory, str(j) + '.npy'),
+                    codes)
+        temporaryPath = metadataPath + '.' + token
+        with open(temporaryPath, 'wb') as f:
+            pickle.dump({'columns': self.columns.tolist(),
+                         'vocabularies': self.vocabularies,
+                         'codes': codesDirectory, 'source': source}, f)
+        os.replace(temporaryPath, metadataPath)
+        if previous is not None and previous != codesDirectory:
+            removeCacheCodes(os.path.join(path, previous))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        # With mmap the codes are memory-mapped read-only instead of read,
+        # opening is immediate whatever the size and every process mapping
+        # the same cache shares its pages. A save in between reading the
+        # pickle and opening the codes it names removes them, the pickle
+        # is then read again
+        while True:
+            metadata = readCacheMetadata(path)
+            try:
+                codes = readCacheCodes(os.path.join(path, metadata['codes']),
+                                       len(metadata['columns']), mmap)
+                break
+            except FileNotFoundError:
+                if readCacheMetadata(path)['codes'] == metadata['codes']:
+                    raise
+        return cls(codes, metadata['vocabularies'], metadata['columns'])
+
+
+# Pickle of a columnar cache directory, written last by every save
+CACHE_METADATA = 'vocabularies.p'
+
+
+def readCacheMetadata(path):
+    # Caches written before the codes file was versioned hold a
+    # (columns, vocabularies) pair next to codes.npy
+    with open(os.path.join(path, CACHE_METADATA), 'rb') as f:
+        metadata = pickle.load(f)
+    if isinstance(metadata, tuple):
+        columns, vocabularies = metadata
+        metadata = {'columns': columns, 'vocabularies': vocabularies,
+                    'codes': 'codes.npy', 'source': None}
+    return metadata
+
+
+def readCacheCodes(codesPath, numberOfColumns, mmap):
+    # Code arrays of a cache. Caches written before the columns had their
+    # own files hold a single column-major .npy matrix, its columns are
+    # then views of it (shared as a copy by the parallel tree builder)
+    mmap_mode = 'r' if mmap else None
+    if not os.path.isdir(codesPath):
+        matrix = np.load(codesPath, mmap_mode=mmap_mode)
+        return [np.asarray(matrix[:, j]) for j in range(numberOfColumns)]
+    return [np.load(os.path.join(codesPath, str(j) + '.npy'),
+                    mmap_mode=mmap_mode) for j in range(numberOfColumns)]
+
+
+def removeCacheCodes(codesPath):
+    # Remove the codes of a replaced save, a codes directory or the single
+    # matrix file of an older cache
+    try:
+        if os.path.isdir(codesPath):
+            shutil.rmtree(codesPath)
+        else:
+            os.remove(codesPath)
+    except FileNotFoundError:
+        pass
+
+
+def load_csv_cached(csv_path, cache_path=None, **read_csv_kwargs):
+    # Encoded dataset of a CSV file. The first call parses and encodes the
+    # file and saves the columnar cache (next to the file by default), later
+    # calls memory-map the cache as long as it is newer than the CSV and
+    # was read with the same read_csv arguments, compared by their repr,
+    # otherwise it is rebuilt
+    if cache_path is None:
+        cache_path = str(csv_path) + '.cache'
+    source = repr(sorted(read_csv_kwargs.items()))
+    metadataPath = os.path.join(cache_path, CACHE_METADATA)
+    if os.path.exists(metadataPath) and \
+            os.path.getmtime(metadataPath) >= os.path.getmtime(csv_path) and \
+            readCacheMetadata(cache_path)['source'] == source:
+        return EncodedDataset.load(cache_path)
+
+    EncodedDataset.from_dataframe(pd.read_csv(csv_path, **read_csv_kwargs)) \
+        .save(cache_path, source)
+    return EncodedDataset.load(cache_path)
+
+
+def columnCodes(df, attribute):
+    # Codes and values of a column of a dataframe or an EncodedDataset
+    if isinstance(df, EncodedDataset):
+        j = df.columns.get_loc(attribute)
+        return df.codes[j], df.vocabularies[j]
+    return encodeColumn(df[attribute])
+
+
+def checkWeights(df, weights):
+    # Sample weights are given per row, in the order of the rows. Weighted
+    # counts are sums of weights, so an integer weight counts like that
+    # many copies of the row. Weights must be finite and not negative, a
+    # negative or NaN weight would give negative or NaN counts
+    if weights is None:
+        return None
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (df.shape[0],):
+        raise ValueError("Expected one weight per row, got weights of shape " +
+                         str(weights.shape))
+    if not np.all(np.isfinite(weights)) or np.any(weights < 0):
+        raise ValueError("Expected finite non-negative weights")
+    return weights
+
+
+def totalWeight(df, weights):
+    # Weighted number of rows, the denominator of the attribute entropy
+    return df.shape[0] if weights is None else weights.sum()
+
+
+def targetCounts(df, weights=None):
+    # Number (or total weight) of rows of each target value, missing
+    # targets are not counted
+    targetCodes, valuesOfTargetAttribute = columnCodes(df, df.columns[-1])
+    numberOfTargetValues = len(valuesOfTargetAttribute)
+    return np.bincount(targetCodes, weights=checkWeights(df, weights),
+                       minlength=numberOfTargetValues +
+                       1)[:numberOfTargetValues]
+
+
+def contingencyTable(attributeCodes, targetCodes, numberOfAttributeValues,
+                     numberOfTargetValues, weights=None, keepMissing=False):
+    # Build the attribute x target count matrix with one bincount over the
+    # flattened pair index, summing the weights of the rows if given. The
+    # extra row and column hold the pairs with a missing code and are
+    # sliced away unless keepMissing is set
+    width = numberOfTargetValues + 1
+    flat = attributeCodes.astype(np.intp) * width + targetCodes
+    counts = np.bincount(flat, weights=weights,
+                         minlength=(numberOfAttributeValues + 1) *
+                         width).reshape(numberOfAttributeValues + 1, width)
+    if keepMissing:
+        return counts
+    return counts[:numberOfAttributeValues, :numberOfTargetValues]
+
+
+# How the rows with a missing attribute value are counted:
+# 'ignore'      they belong to no value but still count in the number of
+#               rows, as == never matches a missing value
+# 'category'    missing is one more value of the attribute
+# 'fractional'  as in C4.5, every such row is spread over the values in
+#               proportion to the rows that have them
+MISSING_POLICIES = ('ignore', 'category', 'fractional')
+
+
+def attributeEntropyOfCodes(attributeCodes, numberOfAttributeValues,
+                            targetCodes, numberOfTargetValues,
+                            totalNumberOfSamples, weights=None,
+                            missing='ignore'):
+    # Entropy of the target given the attribute under a missing value
+    # policy, the policies only rearrange the one count table. Rows with a
+    # missing target are left out, except from totalNumberOfSamples under
+    # the 'ignore' policy
+    if missing == 'ignore':
+        counts = contingencyTable(attributeCodes, targetCodes,
+                                  numberOfAttributeValues,
+                                  numberOfTargetValues, weights)
+        return conditionalEntropy(counts, totalNumberOfSamples)
+    if missing not in MISSING_POLICIES:
+        raise ValueError("Unknown missing value policy " + repr(missing) +
+                         ", expected one of " + str(MISSING_POLICIES))
+
+    counts = contingencyTable(attributeCodes, targetCodes,
+                              numberOfAttributeValues, numberOfTargetValues,
+                              weights, keepMissing=True)[:, :-1]
+    known = counts[:-1]
+    knownTotals = known.sum(axis=1)
+    if missing == 'fractional' and knownTotals.sum() > 0:
+        counts = known + np.outer(knownTotals / knownTotals.sum(), counts[-1])
+    return conditionalEntropy(counts, counts.sum())
+
+
+@profiled
+def get_entropy_of_attribute(df, attribute, weights=None, missing='ignore'):
     entropy_of_attribute = 0
+    weights = checkWeights(df, weights)
 
     if attribute not in df.columns.tolist():
         return entropy_of_attribute
@@ -59,72 +467,1605 @@ def get_entropy_of_attribute(df, attribute):
     # Get the name of the target attribute column
     TARGET_ATTRIBUTE = df.columns.tolist()[-1]
 
-    # Get the list of unique values the attribute can take
-    valuesOfAttribute = df[attribute].unique().tolist()
+    # Integer-code the attribute and the target columns, the codes follow
+    # the order in which unique() lists the values
+    attributeCodes, valuesOfAttribute = columnCodes(df, attribute)
+    targetCodes, valuesOfTargetAttribute = columnCodes(df, TARGET_ATTRIBUTE)
+
+    # Count every (attribute value, target value) pair in a single pass,
+    # get the entropy of every attribute value from its row of counts and
+    # take the sum weighted by the share of the rows
+    entropy_of_attribute = attributeEntropyOfCodes(
+        attributeCodes, len(valuesOfAttribute), targetCodes,
+        len(valuesOfTargetAttribute), totalWeight(df, weights), weights,
+        missing)
 
-    # Get the list of unique values the TARGET_ATTRIBUTE can take
-    valuesOfTargetAttribute = df[TARGET_ATTRIBUTE].unique().tolist()
+    return abs(entropy_of_attribute)
 
-    # Create a dictionary containing the values of attribute as keys
-    # and the values as the outcome:no_of_occurrences
-    # E.g.:
-    # {
-    # 	'val1': {'a':1, 'b':0},
-    # 	'val2': {'a':0, 'b':2}
-    # }
-    answerDict = {}
-    for value in valuesOfAttribute:
-        answerDict[value] = dict.fromkeys(valuesOfTargetAttribute, 0)
 
-    # print(answerDict)
+@profiled
+def get_information_gain(df, attribute, weights=None, missing='ignore'):
+    return abs(get_entropy_of_dataset(df, weights) -
+               get_entropy_of_attribute(df, attribute, weights, missing))
 
-    # Create a dictionary to hold the unique attribute value with the
-    # corresponding df as key-value pairs
-    valuesOfAttribute_Dataframe = {}
 
-    # Fill in the values in to the: valuesOfAttribute_Dataframe, dictionary
-    for value in valuesOfAttribute:
-        valuesOfAttribute_Dataframe[value] = df.loc[df[attribute] == value]
+def encodeDataframe(df):
+    # Integer-code every column of the dataframe once. Returns the list of
+    # the code arrays of the columns, each one contiguous, together with
+    # the list of values of each column
+    if isinstance(df, EncodedDataset):
+        return df.codes, df.vocabularies
+    codes = []
+    vocabularies = []
+    for j in range(df.shape[1]):
+        valueCodes, values = encodeColumn(df.iloc[:, j])
+        codes.append(valueCodes)
+        vocabularies.append(values)
+    return codes, vocabularies
 
-    # For each dataframe
-    for valueOfAttribute in valuesOfAttribute_Dataframe:
-        dataframe = valuesOfAttribute_Dataframe[valueOfAttribute]
 
-        for valueOfTargetAttribute in valuesOfTargetAttribute:
-            # Find to the count of different entries in the target attribute
-            temp = dataframe.loc[dataframe[TARGET_ATTRIBUTE] ==
-                                 valueOfTargetAttribute] \
-                .count().tolist()[-1]
+def splitGain(counts, numberOfRows):
+    # Information gain of splitting numberOfRows rows (with a known target)
+    # by an attribute, from its attribute x target table. The rows with a
+    # missing value are not in the table, so as in C4.5 the gain is the one
+    # over the rows with a known value scaled by their share, a mostly
+    # missing attribute then cannot look like a pure split. Without missing
+    # values this is the gain of get_information_gain
+    knownCounts = counts.sum(axis=0)
+    numberOfKnownRows = knownCounts.sum()
+    if numberOfKnownRows <= 0:
+        return 0.0
+    return float(numberOfKnownRows / numberOfRows *
+                 abs(entropyOfCounts(knownCounts) -
+                     conditionalEntropy(counts, numberOfKnownRows)))
 
-            answerDict[valueOfAttribute][valueOfTargetAttribute] = temp
 
-    # print(answerDict)
+def conditionalEntropy(counts, totalNumberOfSamples):
+    # Vectorized equivalent of entropyFormula followed by
+    # avgInformationEntropy on an attribute x target count matrix. The
+    # weighted sum of the row entropies simplifies to
+    # (sum(N_row log2 N_row) - sum(c log2 c)) / totalNumberOfSamples
+    if totalNumberOfSamples == 0:
+        return 0.0
+    counts = np.asarray(counts)
+    rowTotals = counts.sum(axis=-1)
+    return abs(float((nLogN(rowTotals).sum() - nLogN(counts).sum()) /
+                     totalNumberOfSamples))
 
-    # Use the entropy formula and get the entropy of all the attribute
-    # value pairs and take the sum
-    valueOfAttribute_entropy = entropyFormula(answerDict)
-    entropy_of_attribute = avgInformationEntropy(answerDict,
-                                                 valueOfAttribute_entropy,
-                                                 df.shape[0])
 
-    # 3. Return the sum
-    return abs(entropy_of_attribute)
+def attributeGain(df, attribute, targetCodes, numberOfTargetValues,
+                  entropy_of_dataset, weights=None, missing='ignore'):
+    # Information gain of one attribute given the already coded target
+    attributeCodes, valuesOfAttribute = columnCodes(df, attribute)
+    return abs(entropy_of_dataset - attributeEntropyOfCodes(
+        attributeCodes, len(valuesOfAttribute), targetCodes,
+        numberOfTargetValues, totalWeight(df, weights), weights, missing))
+
+
+def get_information_gains(df, attributes=None, n_threads=None,
+                          weights=None, missing='ignore'):
+    # Batched information gain of every attribute (or of the given ones):
+    # the target is encoded once, the entropy of the dataset is computed
+    # once and each column needs a single counting pass. The columns are
+    # independent, with n_threads they are evaluated on a thread pool as
+    # the NumPy counting releases the GIL
+    if attributes is None:
+        attributes = df.columns[:-1]
+    weights = checkWeights(df, weights)
+    entropy_of_dataset = get_entropy_of_dataset(df, weights)
+    targetCodes, valuesOfTargetAttribute = columnCodes(df, df.columns[-1])
+
+    def gain(attribute):
+        return attributeGain(df, attribute, targetCodes,
+                             len(valuesOfTargetAttribute), entropy_of_dataset,
+                             weights, missing)
+
+    if n_threads is None or n_threads <= 1:
+        gains = map(gain, attributes)
+    else:
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            gains = list(pool.map(gain, attributes))
 
+    return dict(zip(attributes, gains))
 
-def get_information_gain(df, attribute):
-    return abs(get_entropy_of_dataset(df) - get_entropy_of_attribute(df, attribute))
 
+def giniOfCounts(counts):
+    # Gini impurity of every row of a count matrix (or of a count vector)
+    counts = np.asarray(counts, dtype=float)
+    totals = counts.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gini = 1 - ((counts / totals[..., None]) ** 2).sum(axis=-1)
+    return np.where(totals > 0, gini, 0.0), totals
 
-def get_selected_attribute(df):
+
+def get_split_scores(df, attribute, weights=None):
+    # Several split criteria of an attribute from one attribute x target
+    # count table:
+    # information_gain  same value as get_information_gain
+    # gain_ratio        information gain over the split information
+    # gini              decrease of the Gini impurity
+    # chi_square        Pearson's statistic of independence, along with its
+    #                   degrees_of_freedom
+    weights = checkWeights(df, weights)
+    attributeCodes, valuesOfAttribute = columnCodes(df, attribute)
+    targetCodes, valuesOfTargetAttribute = columnCodes(df, df.columns[-1])
+    counts = contingencyTable(attributeCodes, targetCodes,
+                              len(valuesOfAttribute),
+                              len(valuesOfTargetAttribute), weights)
+    classCounts = targetCounts(df, weights)
+
+    # Information gain, the entropy of the attribute is computed in the
+    # same way as get_entropy_of_attribute
+    entropy_of_attribute = conditionalEntropy(counts,
+                                              totalWeight(df, weights))
+    information_gain = abs(entropyOfCounts(classCounts) -
+                           entropy_of_attribute)
+
+    rowTotals = counts.sum(axis=1)
+    columnTotals = counts.sum(axis=0)
+    total = rowTotals.sum()
+
+    split_information = entropyOfCounts(rowTotals)
+    gain_ratio = 0.0
+    if split_information > 0:
+        gain_ratio = information_gain / split_information
+
+    rowGini, _ = giniOfCounts(counts)
+    datasetGini, _ = giniOfCounts(classCounts)
+    gini = 0.0
+    if total > 0:
+        gini = float(datasetGini - (rowTotals / total * rowGini).sum())
+
+    chi_square = 0.0
+    if total > 0:
+        expected = np.outer(rowTotals, columnTotals) / total
+        present = expected > 0
+        chi_square = float((((counts - expected) ** 2)[present] /
+                            expected[present]).sum())
+    degrees_of_freedom = max(int(np.count_nonzero(rowTotals)) - 1, 0) * \
+        max(int(np.count_nonzero(columnTotals)) - 1, 0)
+
+    return {'information_gain': information_gain, 'gain_ratio': gain_ratio,
+            'gini': gini, 'chi_square': chi_square,
+            'degrees_of_freedom': degrees_of_freedom}
+
+
+def get_selected_attribute(df, batched=False, n_threads=None, weights=None,
+                           missing='ignore'):
     information_gains = {}
     selected_column = ''
     max_col = float('-inf')
 
+    # In batched mode all the gains are computed in one sweep up front,
+    # giving n_threads spreads that sweep over a thread pool
+    batched = batched or n_threads is not None
+    if batched:
+        information_gains = get_information_gains(df, n_threads=n_threads,
+                                                  weights=weights,
+                                                  missing=missing)
+
     cols = df.columns
     for i in range(len(cols)-1):
-        information_gains[cols[i]] = get_information_gain(df, cols[i])
+        if not batched:
+            information_gains[cols[i]] = get_information_gain(df, cols[i],
+                                                              weights,
+                                                              missing)
         if(max_col < information_gains[cols[i]]):
             max_col = information_gains[cols[i]]
             selected_column = cols[i]
 
     return (information_gains, selected_column)
+
+
+def get_selected_attribute_pruned(df):
+    # Same selection as get_selected_attribute, but the columns are visited
+    # in decreasing order of an optimistic bound on their gain and the
+    # exact gain is only computed while the bound can still beat the best
+    # one so far. The gain is the mutual information of the attribute and
+    # the target, which is at most the entropy of either of them; with
+    # missing values the gain is computed over all the rows and is not
+    # bounded this way, so those columns are always evaluated.
+    # Returns (information_gains, selected_column, skipped), the gains
+    # only holding the columns that were evaluated
+    if not isinstance(df, EncodedDataset):
+        df = EncodedDataset.from_dataframe(df)
+    cols = df.columns[:-1].tolist()
+    entropy_of_dataset = get_entropy_of_dataset(df)
+    targetCodes, valuesOfTargetAttribute = columnCodes(df, df.columns[-1])
+    numberOfTargetValues = len(valuesOfTargetAttribute)
+    targetMissing = bool((targetCodes == numberOfTargetValues).any())
+
+    # The entropy of an attribute only needs its own value counts
+    bounds = []
+    for col in cols:
+        attributeCodes, valuesOfAttribute = columnCodes(df, col)
+        counts = np.bincount(attributeCodes,
+                             minlength=len(valuesOfAttribute) + 1)
+        if targetMissing or counts[-1] > 0:
+            bounds.append(float('inf'))
+        else:
+            bounds.append(min(entropy_of_dataset,
+                              entropyOfCounts(counts[:-1])))
+
+    information_gains = {}
+    selected = None
+    max_col = float('-inf')
+    skipped = 0
+    for i in sorted(range(len(cols)), key=lambda i: -bounds[i]):
+        # The tolerance keeps columns whose bound ties the best one within
+        # rounding, the earlier column has to win such a tie
+        if bounds[i] + 1e-9 < max_col:
+            skipped += 1
+            continue
+        gain = attributeGain(df, cols[i], targetCodes, numberOfTargetValues,
+                             entropy_of_dataset)
+        information_gains[cols[i]] = gain
+        if max_col < gain or (max_col == gain and i < selected):
+            max_col = gain
+            selected = i
+
+    selected_column = '' if selected is None else cols[selected]
+    return (information_gains, selected_column, skipped)
+
+
+def get_selected_attribute_sampled(df, delta=1e-6, initial_size=10000,
+                                   growth=2, random_state=None):
+    # Approximate get_selected_attribute for very large frames: the gains
+    # are estimated on a random sample of rows (drawn with replacement)
+    # that grows geometrically until the leader beats the runner-up by more
+    # than the Hoeffding bound sqrt(R^2 ln(1/delta) / 2n), R = log2(number
+    # of target values) being the range of the gain. This is a heuristic:
+    # the sample gains are biased plug-in estimates and the test is
+    # repeated as the sample grows, so delta only controls how cautious
+    # the stopping rule is and is not a guarantee on the selection. Once
+    # the sample would reach the size of the frame the exact gains are
+    # returned. Returns (information_gains, selected_column, sample_size)
+    if initial_size < 1:
+        raise ValueError("initial_size must be at least 1, got " +
+                         str(initial_size))
+    if growth <= 1:
+        raise ValueError("growth must be greater than 1, got " + str(growth))
+    rng = np.random.default_rng(random_state)
+    statistics = GainStatistics()
+    numberOfRows = df.shape[0]
+    size = initial_size
+
+    while size < numberOfRows:
+        rows = rng.integers(0, numberOfRows, size - statistics.numberOfRows)
+        statistics.add_rows(df.iloc[rows])
+        information_gains, selected_column = statistics.selected_attribute()
+
+        gains = sorted(information_gains.values(), reverse=True)
+        if len(gains) < 2:
+            return (information_gains, selected_column, size)
+        R = np.log2(max(len(statistics.vocabularies[-1]), 2))
+        epsilon = np.sqrt(R * R * np.log(1 / delta) / (2 * size))
+        if gains[0] - gains[1] > epsilon:
+            return (information_gains, selected_column, size)
+        size = max(int(size * growth), size + 1)
+
+    information_gains, selected_column = get_selected_attribute(df,
+                                                                batched=True)
+    return (information_gains, selected_column, numberOfRows)
+
+
+def get_threshold_split(df, attribute, weights=None):
+    # Best binary split "attribute <= threshold" of a numeric attribute.
+    # The column is sorted once and the class counts left of every
+    # candidate threshold are cumulative sums, so all the thresholds are
+    # evaluated in O(rows). Returns (threshold, information gain), the
+    # threshold is None when the column has fewer than two distinct values
+    weights = checkWeights(df, weights)
+    entropy_of_dataset = get_entropy_of_dataset(df, weights)
+    values = df[attribute].to_numpy(dtype=float)
+    targetCodes, valuesOfTargetAttribute = encodeColumn(df.iloc[:, -1])
+    numberOfTargetValues = len(valuesOfTargetAttribute)
+    rowWeights = np.ones(len(values)) if weights is None else weights
+
+    # Missing values do not go to either side, as in get_entropy_of_attribute
+    present = ~np.isnan(values)
+    values = values[present]
+    targetCodes = targetCodes[present]
+    rowWeights = rowWeights[present]
+    order = np.argsort(values, kind='stable')
+    values = values[order]
+    targetCodes = targetCodes[order]
+    rowWeights = rowWeights[order]
+
+    # Candidate thresholds sit between consecutive distinct values
+    candidates = np.flatnonzero(values[1:] != values[:-1])
+    if len(candidates) == 0:
+        return (None, 0.0)
+
+    left = np.empty((len(candidates), numberOfTargetValues))
+    for k in range(numberOfTargetValues):
+        left[:, k] = np.cumsum((targetCodes == k) * rowWeights)[candidates]
+    right = np.bincount(targetCodes, weights=rowWeights,
+                        minlength=numberOfTargetValues +
+                        1)[:numberOfTargetValues] - left
+
+    leftEntropies, leftTotals = rowEntropies(left)
+    rightEntropies, rightTotals = rowEntropies(right)
+    entropies = (leftTotals * leftEntropies +
+                 rightTotals * rightEntropies) / totalWeight(df, weights)
+    gains = np.abs(entropy_of_dataset - entropies)
+
+    best = int(np.argmax(gains))
+    i = candidates[best]
+    return (float(values[i] + values[i + 1]) / 2, float(gains[best]))
+
+
+def get_threshold_splits(df, attributes=None, weights=None):
+    # Best threshold split of every numeric attribute (or of the given ones)
+    # as {attribute: (threshold, information gain)}
+    if attributes is None:
+        attributes = numericAttributes(df)
+    return {attribute: get_threshold_split(df, attribute, weights)
+            for attribute in attributes}
+
+
+def numericAttributes(df):
+    return [col for col in df.columns[:-1]
+            if pd.api.types.is_numeric_dtype(df[col]) and
+            not pd.api.types.is_bool_dtype(df[col])]
+
+
+# Above this many target values the per-bin bound of get_histogram_split
+# would enumerate too many corners and falls back to the dataset entropy.
+# The corners are evaluated in blocks so the temporaries stay at
+# bins x HISTOGRAM_CORNER_BLOCK x classes whatever the number of classes
+MAX_CLASSES_FOR_HISTOGRAM_BOUND = 8
+HISTOGRAM_CORNER_BLOCK = 32
+
+
+def get_histogram_split(df, attribute, n_bins=256, weights=None):
+    # Approximate threshold split of a numeric attribute: the column is
+    # quantized once into at most n_bins quantile bins, the class counts
+    # of every bin take one bincount and only the bin edges are evaluated.
+    # Returns (threshold, information gain, bound) where bound is an upper
+    # bound on how much more gain the exact search of get_threshold_split
+    # could find. A threshold inside a bin sends some of the bin's rows of
+    # each class to the left side, the weighted entropy of the two sides is
+    # concave in those counts so its minimum over the bin is reached at a
+    # corner where every class goes entirely to one side
+    weights = checkWeights(df, weights)
+    values = df[attribute].to_numpy(dtype=float)
+    targetCodes, valuesOfTargetAttribute = columnCodes(df, df.columns[-1])
+    numberOfTargetValues = len(valuesOfTargetAttribute)
+    entropy_of_dataset = get_entropy_of_dataset(df, weights)
+
+    # Edges at the quantiles, the maximum is never an edge as nothing
+    # would be on the right of it. Bin b holds edges[b-1] < value <= edges[b]
+    present = ~np.isnan(values)
+    edges = np.zeros(0)
+    if present.any():
+        edges = np.unique(np.quantile(values[present],
+                                      np.linspace(0, 1, n_bins + 1)[1:-1]))
+        edges = edges[edges < values[present].max()]
+    numberOfBins = len(edges) + 1
+    binCodes = np.searchsorted(edges, values, side='left')
+    binCodes[~present] = numberOfBins
+    counts = contingencyTable(binCodes, targetCodes, numberOfBins,
+                              numberOfTargetValues, weights)
+
+    def weightedEntropy(left, right):
+        leftEntropies, leftTotals = rowEntropies(left)
+        rightEntropies, rightTotals = rowEntropies(right)
+        return (leftTotals * leftEntropies +
+                rightTotals * rightEntropies) / totalWeight(df, weights)
+
+    cumulative = np.cumsum(counts, axis=0)
+    total = cumulative[-1]
+    threshold = None
+    gain = 0.0
+    if len(edges) > 0:
+        left = cumulative[:-1]
+        gains = np.abs(entropy_of_dataset -
+                       weightedEntropy(left, total - left))
+        best = int(np.argmax(gains))
+        threshold = float(edges[best])
+        gain = float(gains[best])
+
+    gain_bound = entropy_of_dataset
+    if numberOfTargetValues <= MAX_CLASSES_FOR_HISTOGRAM_BOUND:
+        before = (cumulative - counts)[:, None, :]
+        minimum = np.inf
+        for first in range(0, 2 ** numberOfTargetValues,
+                           HISTOGRAM_CORNER_BLOCK):
+            corners = (np.arange(first, min(first + HISTOGRAM_CORNER_BLOCK,
+                                            2 ** numberOfTargetValues))
+                       [:, None] >> np.arange(numberOfTargetValues)) & 1
+            left = before + corners[None, :, :] * counts[:, None, :]
+            minimum = min(minimum, weightedEntropy(left, total - left).min())
+        gain_bound = entropy_of_dataset - minimum
+
+    return (threshold, gain, max(float(gain_bound) - gain, 0.0))
+
+
+def get_histogram_splits(df, attributes=None, n_bins=256, weights=None):
+    # Histogram split of every numeric attribute (or of the given ones) as
+    # {attribute: (threshold, information gain, bound on the gain lost)}
+    if attributes is None:
+        attributes = numericAttributes(df)
+    return {attribute: get_histogram_split(df, attribute, n_bins, weights)
+            for attribute in attributes}
+
+
+def get_selected_split(df, continuous=None, n_bins=None, weights=None):
+    # Split selection over mixed columns: the attributes in continuous
+    # (all the numeric ones by default) are scored by their best threshold
+    # split, the others by their categorical information gain. With n_bins
+    # the thresholds come from the histogram search. Returns
+    # (information_gains, selected_column, thresholds)
+    if n_bins is None:
+        splits = get_threshold_splits(df, continuous, weights)
+    else:
+        splits = {attribute: split[:2] for attribute, split in
+                  get_histogram_splits(df, continuous, n_bins,
+                                       weights).items()}
+    categorical = [col for col in df.columns[:-1] if col not in splits]
+    categorical_gains = get_information_gains(df, categorical,
+                                              weights=weights)
+
+    information_gains = {}
+    thresholds = {}
+    selected_column = ''
+    max_col = float('-inf')
+    for col in df.columns[:-1]:
+        if col in splits:
+            thresholds[col], information_gains[col] = splits[col]
+        else:
+            information_gains[col] = categorical_gains[col]
+        if(max_col < information_gains[col]):
+            max_col = information_gains[col]
+            selected_column = col
+
+    return (information_gains, selected_column, thresholds)
+
+
+def splitNode(codes, vocabularies, columns, order, start, end, attributes,
+              depth, max_depth, min_samples_split, max_features=None,
+              rng=None, orderWeights=None):
+    # Make the node over the rows order[start:end] and split it if it
+    # should be. Each node is a range of the shared order array, splitting
+    # a node partitions its range in place so no data is copied besides
+    # the node sized temporaries. With max_features, the node only
+    # considers that many attributes drawn at random with rng.
+    # orderWeights holds the sample weights of the rows in the order of
+    # the order array and is partitioned along with it. Returns
+    # (node, remaining attributes, [(value, childStart, childEnd), ...]),
+    # the children still have to be grown over their ranges
+    rows = order[start:end]
+    rowWeights = None
+    if orderWeights is not None:
+        rowWeights = orderWeights[start:end]
+    targetCodes = codes[-1][rows]
+    numberOfTargetValues = len(vocabularies[-1])
+    classCounts = np.bincount(targetCodes, weights=rowWeights,
+                              minlength=numberOfTargetValues +
+                              1)[:numberOfTargetValues]
+
+    node = {'label': None, 'samples': end - start}
+    if numberOfTargetValues > 0:
+        node['label'] = vocabularies[-1][int(np.argmax(classCounts))]
+
+    if (np.count_nonzero(classCounts) <= 1 or not attributes or
+            end - start < min_samples_split or
+            (max_depth is not None and depth >= max_depth)):
+        return node, attributes, []
+
+    candidates = attributes
+    if max_features is not None and max_features < len(attributes):
+        candidates = sorted(rng.choice(attributes, max_features,
+                                       replace=False).tolist())
+
+    # Pick the attribute with the highest information gain at this node,
+    # the first one wins a tie as in get_selected_attribute
+    numberOfKnownRows = classCounts.sum()
+    selected = None
+    max_gain = 0.0
+    for j in candidates:
+        counts = contingencyTable(codes[j][rows], targetCodes,
+                                  len(vocabularies[j]), numberOfTargetValues,
+                                  rowWeights)
+        gain = splitGain(counts, numberOfKnownRows)
+        if gain > max_gain:
+            max_gain = gain
+            selected = j
+
+    if selected is None:
+        return node, attributes, []
+
+    # Partition the range by the selected attribute, rows with a missing
+    # value go along with the rows of the largest child
+    numberOfValues = len(vocabularies[selected])
+    attributeCodes = codes[selected][rows]
+    sizes = np.bincount(attributeCodes, minlength=numberOfValues + 1)
+    attributeCodes = np.where(attributeCodes == numberOfValues,
+                              np.argmax(sizes[:numberOfValues]),
+                              attributeCodes)
+    permutation = np.argsort(attributeCodes, kind='stable')
+    order[start:end] = rows[permutation]
+    if orderWeights is not None:
+        orderWeights[start:end] = rowWeights[permutation]
+    sizes = np.bincount(attributeCodes, minlength=numberOfValues)
+    del rows, rowWeights, targetCodes, attributeCodes, permutation
+
+    node['attribute'] = columns[selected]
+    node['gain'] = max_gain
+    node['children'] = {}
+    remaining = [j for j in attributes if j != selected]
+    childRanges = []
+    childStart = start
+    for code, value in enumerate(vocabularies[selected]):
+        childEnd = childStart + int(sizes[code])
+        if childEnd > childStart:
+            childRanges.append((value, childStart, childEnd))
+        childStart = childEnd
+    return node, remaining, childRanges
+
+
+def growTree(codes, vocabularies, columns, order, start, end, attributes,
+             depth, max_depth, min_samples_split, max_features=None,
+             rng=None, orderWeights=None):
+    # Grow the subtree over the rows order[start:end] serially, see
+    # splitNode for the arguments
+    node, remaining, childRanges = splitNode(
+        codes, vocabularies, columns, order, start, end, attributes, depth,
+        max_depth, min_samples_split, max_features, rng, orderWeights)
+    for value, childStart, childEnd in childRanges:
+        node['children'][value] = growTree(
+            codes, vocabularies, columns, order, childStart, childEnd,
+            remaining, depth + 1, max_depth, min_samples_split, max_features,
+            rng, orderWeights)
+    return node
+
+
+def growTreeParallel(codes, vocabularies, columns, order, attributes,
+                     max_depth, min_samples_split, pool, n_jobs,
+                     parallel_threshold, orderWeights=None):
+    # Grow the top of the tree in the parent breadth first, always
+    # splitting the largest waiting subtree, until n_jobs subtrees of at
+    # least parallel_threshold rows are waiting or none is left. Those are
+    # then grown by the worker processes while the parent grows the
+    # smaller ones, so the work spreads over all the workers and not only
+    # over the children of the root. A waiting subtree is
+    # (parent children dict, value, start, end, attributes, depth)
+    root = {}
+    waiting = [(root, None, 0, len(order), attributes, 0)]
+    while True:
+        large = [i for i, (_, _, start, end, _, _) in enumerate(waiting)
+                 if end - start >= parallel_threshold]
+        if not large or len(large) >= n_jobs:
+            break
+        i = max(large, key=lambda i: waiting[i][3] - waiting[i][2])
+        children, value, start, end, attributes, depth = waiting.pop(i)
+        node, remaining, childRanges = splitNode(
+            codes, vocabularies, columns, order, start, end, attributes,
+            depth, max_depth, min_samples_split, orderWeights=orderWeights)
+        children[value] = node
+        for childValue, childStart, childEnd in childRanges:
+            # Keep the slot so the children stay in vocabulary order
+            node['children'][childValue] = None
+            waiting.append((node['children'], childValue, childStart,
+                            childEnd, remaining, depth + 1))
+
+    futures = []
+    for children, value, start, end, attributes, depth in waiting:
+        if end - start >= parallel_threshold:
+            childWeights = None
+            if orderWeights is not None:
+                childWeights = orderWeights[start:end]
+            futures.append((children, value, pool.submit(
+                growSharedSubtree, order[start:end], childWeights,
+                attributes, depth, max_depth, min_samples_split)))
+    for children, value, start, end, attributes, depth in waiting:
+        if end - start < parallel_threshold:
+            children[value] = growTree(
+                codes, vocabularies, columns, order, start, end, attributes,
+                depth, max_depth, min_samples_split,
+                orderWeights=orderWeights)
+    for children, value, future in futures:
+        children[value] = future.result()
+    return root[None]
+
+
+# Encoded dataset of a worker process of the parallel tree builder,
+# attached once per worker to the shared memory block of the parent
+_sharedDataset = {}
+
+
+def sharedColumns(buffer, numberOfRows, layout):
+    # Code arrays of the columns laid out in a shared memory block, layout
+    # holding the (offset, dtype) of each column
+    return [np.ndarray(numberOfRows, dtype=dtype, buffer=buffer,
+                       offset=offset) for offset, dtype in layout]
+
+
+def attachSharedDataset(name, numberOfRows, layout, vocabularies, columns):
+    shm = shared_memory.SharedMemory(name=name)
+    _sharedDataset['shm'] = shm
+    _sharedDataset['codes'] = sharedColumns(shm.buf, numberOfRows, layout)
+    _sharedDataset['vocabularies'] = vocabularies
+    _sharedDataset['columns'] = columns
+
+
+def attachMappedDataset(paths, vocabularies, columns):
+    _sharedDataset['codes'] = [np.load(path, mmap_mode='r')
+                               for path in paths]
+    _sharedDataset['vocabularies'] = vocabularies
+    _sharedDataset['columns'] = columns
+
+
+@contextmanager
+def sharedDatasetPool(codes, vocabularies, columns, n_jobs):
+    # Copy the codes of the columns one after the other into a shared
+    # memory block and start a process pool whose workers attach to it,
+    # yields the shared code arrays and the pool. Codes memory-mapped from
+    # a dataset cache are already shared, the workers map the same files
+    # instead
+    if all(isinstance(column, np.memmap) and column.filename is not None
+           for column in codes):
+        with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=attachMappedDataset,
+                initargs=([column.filename for column in codes],
+                          vocabularies, columns)) as pool:
+            yield codes, pool
+        return
+
+    numberOfRows = len(codes[0])
+    layout = []
+    size = 0
+    for column in codes:
+        layout.append((size, column.dtype.str))
+        # Keep every column aligned to 8 bytes
+        size += -(-column.nbytes // 8) * 8
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    shared = None
+    try:
+        shared = sharedColumns(shm.buf, numberOfRows, layout)
+        for sharedColumn, column in zip(shared, codes):
+            sharedColumn[:] = column
+        with ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=attachSharedDataset,
+                initargs=(shm.name, numberOfRows, layout, vocabularies,
+                          columns)) as pool:
+            yield shared, pool
+    finally:
+        # The array must be released before the block can be closed
+        shared = None
+        shm.close()
+        shm.unlink()
+
+
+def growSharedSubtree(rows, rowWeights, attributes, depth, max_depth,
+                      min_samples_split):
+    # Runs in a worker: rows (and rowWeights) are the worker's own copy of
+    # the subtree's part of the order array, partitioned in place serially
+    return growTree(_sharedDataset['codes'], _sharedDataset['vocabularies'],
+                    _sharedDataset['columns'], rows, 0, len(rows), attributes,
+                    depth, max_depth, min_samples_split,
+                    orderWeights=rowWeights)
+
+
+def build_tree(df, max_depth=None, min_samples_split=2, n_jobs=None,
+               parallel_threshold=10000, weights=None):
+    # ID3 decision tree over the whole dataframe, the last column being the
+    # target. Internal nodes are dictionaries
+    # {'attribute', 'gain', 'label', 'samples', 'children': {value: node}}
+    # and leaves only carry 'label' (majority class) and 'samples'.
+    # With n_jobs > 1 (-1 for all cores) the encoded dataset is placed in
+    # shared memory, the parent splits the top nodes until about n_jobs
+    # subtrees of at least parallel_threshold rows are left and those are
+    # built by a process pool, smaller ones are built serially. With
+    # weights the gains and majority labels use the weighted counts. The
+    # gains of attributes with missing values are scaled down as in C4.5
+    # (see splitGain) and the rows with a missing value of the split
+    # attribute go to its largest child
+    codes, vocabularies = encodeDataframe(df)
+    columns = df.columns.tolist()
+    order = np.arange(df.shape[0])
+    attributes = list(range(df.shape[1]-1))
+    orderWeights = checkWeights(df, weights)
+    if orderWeights is not None:
+        orderWeights = orderWeights.copy()
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs is None or n_jobs <= 1:
+        return growTree(codes, vocabularies, columns, order, 0, df.shape[0],
+                        attributes, 0, max_depth, min_samples_split,
+                        orderWeights=orderWeights)
+
+    with sharedDatasetPool(codes, vocabularies, columns, n_jobs) as \
+            (shared, pool):
+        return growTreeParallel(shared, vocabularies, columns, order,
+                                attributes, max_depth, min_samples_split,
+                                pool, n_jobs, parallel_threshold,
+                                orderWeights)
+
+
+def predict(tree, df):
+    # Walk the tree for every row, a value not seen during training stops
+    # at the current node and takes its majority label
+    predictions = []
+    for _, row in df.iterrows():
+        node = tree
+        while 'children' in node and row[node['attribute']] in \
+                node['children']:
+            node = node['children'][row[node['attribute']]]
+        predictions.append(node['label'])
+    return predictions
+
+
+class CompiledTree:
+    # A tree from build_tree flattened into parallel arrays indexed by node
+    # number (the root is node 0):
+    # feature      index into attributes of the split attribute, -1 on leaves
+    # childOffset  start of the node's block in children, which holds the
+    #              child of every code of the split attribute (-1 if none)
+    # label        index into classes of the node's majority label
+    # Prediction moves all the rows one level down per step with
+    # vectorized gathers instead of walking the dictionaries row by row.
+    # By default only the attributes, values and classes found in the tree
+    # are coded, trees sharing a dataset's coding can be compiled against
+    # its attributes, vocabularies and classes instead
+    def __init__(self, tree, attributes=None, vocabularies=None,
+                 classes=None):
+        self.attributes = list(attributes or [])
+        self.vocabularies = [list(values) for values in vocabularies or []]
+        self.classes = list(classes or [])
+        nodes = []
+        attributeIndex = {attribute: f for f, attribute in
+                          enumerate(self.attributes)}
+        classIndex = {value: i for i, value in enumerate(self.classes)}
+        valueIndex = [{value: code for code, value in enumerate(values)}
+                      for values in self.vocabularies]
+        self.collect(tree, nodes, attributeIndex, classIndex, valueIndex)
+
+        feature = []
+        childOffset = []
+        label = []
+        children = []
+        number = {id(node): i for i, node in enumerate(nodes)}
+        for node in nodes:
+            label.append(classIndex[node['label']])
+            if 'children' not in node:
+                feature.append(-1)
+                childOffset.append(-1)
+                continue
+            f = attributeIndex[node['attribute']]
+            block = [-1] * len(self.vocabularies[f])
+            for value, child in node['children'].items():
+                block[valueIndex[f][value]] = number[id(child)]
+            feature.append(f)
+            childOffset.append(len(children))
+            children.extend(block)
+
+        self.feature = np.array(feature, dtype=np.intp)
+        self.childOffset = np.array(childOffset, dtype=np.intp)
+        self.label = np.array(label, dtype=np.intp)
+        self.children = np.array(children, dtype=np.intp)
+
+    def collect(self, node, nodes, attributeIndex, classIndex, valueIndex):
+        # Number the nodes breadth first and gather the attributes, the
+        # values of each attribute and the classes used by the tree
+        queue = deque([node])
+        while queue:
+            node = queue.popleft()
+            nodes.append(node)
+            if node['label'] not in classIndex:
+                classIndex[node['label']] = len(self.classes)
+                self.classes.append(node['label'])
+            if 'children' not in node:
+                continue
+            if node['attribute'] not in attributeIndex:
+                attributeIndex[node['attribute']] = len(self.attributes)
+                self.attributes.append(node['attribute'])
+                self.vocabularies.append([])
+                valueIndex.append({})
+            f = attributeIndex[node['attribute']]
+            for value, child in node['children'].items():
+                if value not in valueIndex[f]:
+                    valueIndex[f][value] = len(self.vocabularies[f])
+                    self.vocabularies[f].append(value)
+                queue.append(child)
+
+    def encode(self, df):
+        # Codes of the tree's attributes for a dataframe or an
+        # EncodedDataset, -1 for values the tree has never seen
+        X = np.empty((df.shape[0], len(self.attributes)), dtype=np.intp,
+                     order='F')
+        for f, attribute in enumerate(self.attributes):
+            vocabulary = pd.Index(self.vocabularies[f])
+            if isinstance(df, EncodedDataset):
+                codes, values = columnCodes(df, attribute)
+                translate = np.append(vocabulary.get_indexer(values), -1)
+                X[:, f] = translate[codes]
+            else:
+                X[:, f] = vocabulary.get_indexer(df[attribute])
+        return X
+
+    def predict_codes(self, X):
+        # Index into classes of the prediction of every encoded row
+        node = np.zeros(X.shape[0], dtype=np.intp)
+        active = np.arange(X.shape[0])
+        while len(active):
+            current = node[active]
+            f = self.feature[current]
+            split = f >= 0
+            active, current, f = active[split], current[split], f[split]
+
+            codes = X[active, f]
+            child = np.full(len(active), -1, dtype=np.intp)
+            known = codes >= 0
+            child[known] = self.children[self.childOffset[current[known]] +
+                                         codes[known]]
+
+            moving = child >= 0
+            active = active[moving]
+            node[active] = child[moving]
+        return self.label[node]
+
+    def predict(self, df):
+        classes = np.empty(len(self.classes), dtype=object)
+        classes[:] = self.classes
+        return classes[self.predict_codes(self.encode(df))].tolist()
+
+
+def compile_tree(tree):
+    return CompiledTree(tree)
+
+
+def resolveMaxFeatures(max_features, numberOfAttributes):
+    if max_features == 'sqrt':
+        return max(1, int(np.sqrt(numberOfAttributes)))
+    if max_features == 'log2':
+        return max(1, int(np.log2(max(numberOfAttributes, 1))))
+    return max_features
+
+
+def growForestTree(codes, vocabularies, columns, seed, max_features,
+                   max_depth, min_samples_split):
+    # One tree of a forest: a bootstrap sample of the rows is the initial
+    # order array, the codes themselves are never copied
+    rng = np.random.default_rng(seed)
+    order = rng.integers(0, len(codes[-1]), len(codes[-1]))
+    tree = growTree(codes, vocabularies, columns, order, 0, len(order),
+                    list(range(len(columns) - 1)), 0, max_depth,
+                    min_samples_split, max_features=max_features, rng=rng)
+    return CompiledTree(tree, columns[:-1], vocabularies[:-1],
+                        vocabularies[-1])
+
+
+def growSharedForestTree(seed, max_features, max_depth, min_samples_split):
+    return growForestTree(_sharedDataset['codes'],
+                          _sharedDataset['vocabularies'],
+                          _sharedDataset['columns'], seed, max_features,
+                          max_depth, min_samples_split)
+
+
+class Forest:
+    # Bagged ID3 trees compiled against the coding of the training data, so
+    # rows are encoded once and the votes of all the trees are counted with
+    # one bincount per tree
+    def __init__(self, trees, classes):
+        self.trees = trees
+        self.classes = classes
+
+    def predict_codes(self, X):
+        numberOfClasses = len(self.classes)
+        offsets = np.arange(X.shape[0]) * numberOfClasses
+        votes = np.zeros(X.shape[0] * numberOfClasses, dtype=np.intp)
+        for tree in self.trees:
+            votes += np.bincount(offsets + tree.predict_codes(X),
+                                 minlength=len(votes))
+        # Ties go to the class seen first in the training data
+        return np.argmax(votes.reshape(-1, numberOfClasses), axis=1)
+
+    def predict(self, df):
+        classes = np.empty(len(self.classes), dtype=object)
+        classes[:] = self.classes
+        X = self.trees[0].encode(df)
+        return classes[self.predict_codes(X)].tolist()
+
+
+def build_forest(df, n_trees=100, max_features='sqrt', max_depth=None,
+                 min_samples_split=2, n_jobs=None, random_state=None):
+    # Random forest of ID3 trees, each grown on a bootstrap sample of the
+    # rows and choosing every split among max_features random attributes
+    # ('sqrt', 'log2', an int or None for all). With n_jobs > 1 (-1 for all
+    # cores) the trees are grown by a process pool attached to the encoded
+    # dataset in shared memory
+    codes, vocabularies = encodeDataframe(df)
+    columns = df.columns.tolist()
+    max_features = resolveMaxFeatures(max_features, len(columns) - 1)
+    seeds = np.random.SeedSequence(random_state).spawn(n_trees)
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs is None or n_jobs <= 1:
+        trees = [growForestTree(codes, vocabularies, columns, seed,
+                                max_features, max_depth, min_samples_split)
+                 for seed in seeds]
+    else:
+        with sharedDatasetPool(codes, vocabularies, columns, n_jobs) as \
+                (shared, pool):
+            trees = list(pool.map(growSharedForestTree, seeds,
+                                  [max_features] * n_trees,
+                                  [max_depth] * n_trees,
+                                  [min_samples_split] * n_trees))
+
+    return Forest(trees, vocabularies[-1])
+
+
+def streamCodes(column, vocabulary, grow=True):
+    # Codes of a batch column in a stream-wide vocabulary, a dict of value
+    # to code. New values are appended to it, or get -1 like the missing
+    # values when grow is False
+    codes, uniques = pd.factorize(column)
+    mapping = np.empty(len(uniques) + 1, dtype=np.intp)
+    for i, value in enumerate(uniques.tolist()):
+        if grow:
+            mapping[i] = vocabulary.setdefault(value, len(vocabulary))
+        else:
+            mapping[i] = vocabulary.get(value, -1)
+    mapping[-1] = -1
+    return mapping[codes]
+
+
+def growCounts(counts, shape):
+    # Zero pad a count table to a larger shape after new values appeared
+    if counts.shape == shape:
+        return counts
+    grown = np.zeros(shape, dtype=counts.dtype)
+    grown[tuple(slice(0, n) for n in counts.shape)] = counts
+    return grown
+
+
+class GainStatistics:
+    # Attribute x target count tables accumulated over batches of rows, so
+    # entropies and gains can be computed without holding the data. Values
+    # are coded in order of first appearance across all the batches, which
+    # keeps the results identical to the in-memory functions on the
+    # concatenated frame. Batches can also be removed again, so the
+    # statistics of a sliding window are maintained in time proportional
+    # to the batch and the number of distinct values
+    def __init__(self, df=None):
+        self.columns = None
+        self.vocabularies = []
+        self.counts = []
+        self.targetCounts = np.zeros(0, dtype=np.int64)
+        self.numberOfRows = 0
+        if df is not None:
+            self.add_rows(df)
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        statistics = cls()
+        for chunk in chunks:
+            statistics.add_rows(chunk)
+        return statistics
+
+    def checkColumns(self, columns):
+        # The first batch fixes the columns, later ones must match them
+        if self.columns is None:
+            self.columns = list(columns)
+            self.vocabularies = [{} for _ in self.columns]
+            self.counts = [np.zeros((0, 0), dtype=np.int64)
+                           for _ in self.columns[:-1]]
+        elif list(columns) != self.columns:
+            raise ValueError("The columns of the batch do not match " +
+                             str(self.columns))
+
+    def batchCounts(self, df, grow=True):
+        # Target counts and attribute x target tables of one batch, in the
+        # stream-wide coding, with the stored tables grown to match. Unless
+        # grow is set the batch must only hold values already seen, as the
+        # rows of a batch being removed were added before, otherwise it
+        # raises before any state is changed
+        if not grow and self.columns is None:
+            raise ValueError("Cannot remove rows that were not added")
+        self.checkColumns(df.columns)
+
+        codes = []
+        for j in range(len(self.columns)):
+            column = df.iloc[:, j]
+            batchCodes = streamCodes(column, self.vocabularies[j], grow)
+            if not grow and (batchCodes[column.notna().to_numpy()] <
+                             0).any():
+                raise ValueError("Cannot remove rows that were not added")
+            codes.append(batchCodes)
+
+        targetCodes = codes[-1]
+        numberOfTargetValues = len(self.vocabularies[-1])
+        targetPresent = targetCodes >= 0
+        self.targetCounts = growCounts(self.targetCounts,
+                                       (numberOfTargetValues,))
+        targetCounts = np.bincount(targetCodes[targetPresent],
+                                   minlength=numberOfTargetValues)
+
+        tables = []
+        for j in range(len(self.columns) - 1):
+            attributeCodes = codes[j]
+            numberOfAttributeValues = len(self.vocabularies[j])
+            present = targetPresent & (attributeCodes >= 0)
+            self.counts[j] = growCounts(self.counts[j],
+                                        (numberOfAttributeValues,
+                                         numberOfTargetValues))
+            tables.append(contingencyTable(
+                attributeCodes[present], targetCodes[present],
+                numberOfAttributeValues, numberOfTargetValues))
+
+        return targetCounts, tables
+
+    def add_rows(self, df):
+        targetCounts, tables = self.batchCounts(df)
+        self.targetCounts += targetCounts
+        for j, table in enumerate(tables):
+            self.counts[j] += table
+        self.numberOfRows += df.shape[0]
+
+    def remove_rows(self, df):
+        # Forget a batch of rows that was added before. Values whose counts
+        # drop to 0 stay in the vocabularies but no longer contribute
+        targetCounts, tables = self.batchCounts(df, grow=False)
+        if df.shape[0] > self.numberOfRows or \
+                (targetCounts > self.targetCounts).any() or \
+                any((table > counts).any()
+                    for table, counts in zip(tables, self.counts)):
+            raise ValueError("Cannot remove rows that were not added")
+        self.targetCounts -= targetCounts
+        for j, table in enumerate(tables):
+            self.counts[j] -= table
+        self.numberOfRows -= df.shape[0]
+
+    def merge(self, other):
+        # Add the counts of statistics gathered separately, e.g. over
+        # another partition of the data. The values of other are appended
+        # to the vocabularies in its own order, so merging partitions in
+        # order gives the same coding as reading them one after the other
+        if other.columns is None:
+            return self
+        self.checkColumns(other.columns)
+
+        mappings = []
+        for j in range(len(self.columns)):
+            vocabulary = self.vocabularies[j]
+            mappings.append(np.array(
+                [vocabulary.setdefault(value, len(vocabulary))
+                 for value in other.vocabularies[j]], dtype=np.intp))
+
+        numberOfTargetValues = len(self.vocabularies[-1])
+        self.targetCounts = growCounts(self.targetCounts,
+                                       (numberOfTargetValues,))
+        self.targetCounts[mappings[-1]] += other.targetCounts
+        for j in range(len(self.columns) - 1):
+            self.counts[j] = growCounts(self.counts[j],
+                                        (len(self.vocabularies[j]),
+                                         numberOfTargetValues))
+            self.counts[j][np.ix_(mappings[j], mappings[-1])] += \
+                other.counts[j]
+        self.numberOfRows += other.numberOfRows
+        return self
+
+    def entropy_of_dataset(self):
+        return entropyOfCounts(self.targetCounts)
+
+    def entropy_of_attribute(self, attribute):
+        if self.columns is None or attribute not in self.columns[:-1]:
+            return 0
+        j = self.columns.index(attribute)
+        return conditionalEntropy(self.counts[j], self.numberOfRows)
+
+    def information_gain(self, attribute):
+        return abs(self.entropy_of_dataset() -
+                   self.entropy_of_attribute(attribute))
+
+    def selected_attribute(self):
+        information_gains = {}
+        selected_column = ''
+        max_col = float('-inf')
+
+        for col in (self.columns or [])[:-1]:
+            information_gains[col] = self.information_gain(col)
+            if(max_col < information_gains[col]):
+                max_col = information_gains[col]
+                selected_column = col
+
+        return (information_gains, selected_column)
+
+
+def get_entropy_of_dataset_streaming(chunks):
+    # The streaming variants take an iterable of dataframes, e.g.
+    # pd.read_csv(path, chunksize=100000), and see every row once
+    return GainStatistics.from_chunks(chunks).entropy_of_dataset()
+
+
+def get_entropy_of_attribute_streaming(chunks, attribute):
+    return GainStatistics.from_chunks(chunks).entropy_of_attribute(attribute)
+
+
+def get_information_gain_streaming(chunks, attribute):
+    return GainStatistics.from_chunks(chunks).information_gain(attribute)
+
+
+def get_selected_attribute_streaming(chunks):
+    return GainStatistics.from_chunks(chunks).selected_attribute()
+
+
+class HoeffdingTree:
+    # Very fast decision tree (Domingos and Hulten) learnt in one pass over
+    # a stream of batches. A leaf keeps only its class counts and an
+    # attribute x target count table per candidate attribute, so its memory
+    # depends on the number of distinct values and not on the rows seen.
+    # After a batch, every leaf that has seen grace_period rows since its
+    # last check computes the gains of its candidates as build_tree does,
+    # over the rows it has seen itself. It splits on
+    # the best one once that beats not splitting (a gain of 0) and the
+    # runner-up by more than the Hoeffding bound sqrt(R^2 ln(1/delta) / 2n),
+    # R = log2(number of target values), or beats not splitting by the
+    # bound once the bound has dropped below tie_threshold. The nodes are
+    # indexed by number, the root is node 0:
+    # attribute   index of the split attribute, -1 on leaves
+    # children    child of every code of the split attribute (-1 if none)
+    # classCounts class counts for the prediction, a new child starts with
+    #             the counts of its value at the parent
+    # rowCounts   class counts of the rows the leaf has seen itself, which
+    #             the entropy, the gains and the bound are computed from
+    # candidates  attributes a leaf may split on, for a split node the ones
+    #             left to its children
+    # counts      the tables of the candidates, None once the leaf splits
+    # Values are coded in order of first appearance as in GainStatistics
+    def __init__(self, delta=1e-7, grace_period=200, tie_threshold=0.05,
+                 max_depth=None):
+        self.delta = delta
+        self.grace_period = grace_period
+        self.tie_threshold = tie_threshold
+        self.max_depth = max_depth
+        self.columns = None
+        self.vocabularies = []
+        self.attribute = []
+        self.children = []
+        self.classCounts = []
+        self.rowCounts = []
+        self.candidates = []
+        self.counts = []
+        self.depth = []
+        self.pending = []
+        self.gain = []
+        self.numberOfRows = 0
+
+    @classmethod
+    def from_chunks(cls, chunks, **kw):
+        learner = cls(**kw)
+        for chunk in chunks:
+            learner.partial_fit(chunk)
+        return learner
+
+    def addNode(self, classCounts, candidates, depth):
+        # New leaf, one at the maximum depth keeps no tables as it will
+        # never split
+        if self.max_depth is not None and depth >= self.max_depth:
+            candidates = []
+        self.attribute.append(-1)
+        self.children.append(None)
+        self.classCounts.append(classCounts)
+        self.rowCounts.append(np.zeros(0, dtype=np.int64))
+        self.candidates.append(list(candidates))
+        self.counts.append([np.zeros((0, 0), dtype=np.int64)
+                            for _ in candidates])
+        self.depth.append(depth)
+        self.pending.append(0)
+        self.gain.append(0.0)
+        return len(self.attribute) - 1
+
+    def checkColumns(self, columns):
+        # The first batch fixes the columns and creates the root
+        if self.columns is None:
+            self.columns = list(columns)
+            self.vocabularies = [{} for _ in self.columns]
+            self.addNode(np.zeros(0, dtype=np.int64),
+                         range(len(self.columns) - 1), 0)
+        elif list(columns) != self.columns:
+            raise ValueError("The columns of the batch do not match " +
+                             str(self.columns))
+
+    def encode(self, df, grow=True):
+        # Codes of a batch in the stream-wide coding, missing values (and
+        # unseen ones unless grow) get code len(vocabulary) of their column
+        # as in encodeColumn
+        X = np.empty((df.shape[0], len(self.columns)), dtype=np.intp)
+        for j, vocabulary in enumerate(self.vocabularies):
+            codes = streamCodes(df.iloc[:, j], vocabulary, grow)
+            codes[codes < 0] = len(vocabulary)
+            X[:, j] = codes
+        return X
+
+    def route(self, X, grow=False):
+        # Node reached by every row, moving the rows one level down per
+        # step. A row stops at a split node when its value is missing or
+        # the node has no child for it, when grow is set a value first
+        # seen after the split gets a new leaf instead
+        nodes = np.zeros(X.shape[0], dtype=np.intp)
+        active = np.arange(X.shape[0])
+        while len(active):
+            moved = []
+            current = nodes[active]
+            for node in np.unique(current).tolist():
+                j = self.attribute[node]
+                if j < 0:
+                    continue
+                rows = active[current == node]
+                codes = X[rows, j]
+                if grow:
+                    self.growChildren(node, codes)
+                children = self.children[node]
+                child = np.full(len(rows), -1, dtype=np.intp)
+                known = codes < len(children)
+                child[known] = children[codes[known]]
+                moving = child >= 0
+                nodes[rows[moving]] = child[moving]
+                moved.append(rows[moving])
+            active = np.concatenate(moved or [np.empty(0, np.intp)])
+        return nodes
+
+    def growChildren(self, node, codes):
+        # Add empty leaves for the values of a split node's attribute that
+        # appeared after it split
+        j = self.attribute[node]
+        size = len(self.vocabularies[j])
+        children = self.children[node]
+        if len(children) < size:
+            children = np.concatenate([children, np.full(
+                size - len(children), -1, dtype=np.intp)])
+        for code in np.unique(codes[codes < size]).tolist():
+            if children[code] < 0:
+                children[code] = self.addNode(
+                    np.zeros(len(self.classCounts[node]), dtype=np.int64),
+                    self.candidates[node], self.depth[node] + 1)
+        self.children[node] = children
+
+    def partial_fit(self, df):
+        # Learn from one batch: the rows are routed to their leaves, which
+        # add the batch counts with one bincount per candidate and then
+        # try to split. Rows with a missing target are skipped
+        self.checkColumns(df.columns)
+        X = self.encode(df)
+        numberOfTargetValues = len(self.vocabularies[-1])
+        X = X[X[:, -1] < numberOfTargetValues]
+        self.numberOfRows += X.shape[0]
+
+        nodes = self.route(X, grow=True)
+        order = np.argsort(nodes, kind='stable')
+        leaves, starts = np.unique(nodes[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for leaf, start, end in zip(leaves.tolist(), starts, ends):
+            if self.attribute[leaf] >= 0:
+                continue
+            rows = X[order[start:end]]
+            targetCodes = rows[:, -1]
+            batchCounts = np.bincount(targetCodes,
+                                      minlength=numberOfTargetValues)
+            self.classCounts[leaf] = growCounts(
+                self.classCounts[leaf], (numberOfTargetValues,)) + batchCounts
+            self.rowCounts[leaf] = growCounts(
+                self.rowCounts[leaf], (numberOfTargetValues,)) + batchCounts
+            for k, j in enumerate(self.candidates[leaf]):
+                numberOfAttributeValues = len(self.vocabularies[j])
+                self.counts[leaf][k] = growCounts(
+                    self.counts[leaf][k],
+                    (numberOfAttributeValues, numberOfTargetValues)) + \
+                    contingencyTable(rows[:, j], targetCodes,
+                                     numberOfAttributeValues,
+                                     numberOfTargetValues)
+            self.pending[leaf] += end - start
+            if self.pending[leaf] >= self.grace_period:
+                self.attemptSplit(leaf)
+        return self
+
+    def attemptSplit(self, leaf):
+        self.pending[leaf] = 0
+        rowCounts = self.rowCounts[leaf]
+        if np.count_nonzero(rowCounts) <= 1 or not self.candidates[leaf]:
+            return
+
+        # Gains over the rows the leaf has seen, as in build_tree, the
+        # first attribute wins a tie
+        numberOfRows = rowCounts.sum()
+        gains = [splitGain(counts, numberOfRows)
+                 for counts in self.counts[leaf]]
+        best = int(np.argmax(gains))
+        runnerUp = max(gains[:best] + gains[best + 1:], default=0.0)
+
+        R = np.log2(max(len(rowCounts), 2))
+        epsilon = np.sqrt(R * R * np.log(1 / self.delta) /
+                          (2 * numberOfRows))
+        # Not splitting competes as an attribute of gain 0, so a tie only
+        # breaks once the best gain itself beats the bound
+        if gains[best] <= epsilon or (gains[best] - runnerUp <= epsilon and
+                                      epsilon >= self.tie_threshold):
+            return
+
+        # The children start with the class counts of their value so they
+        # predict well before seeing rows of their own
+        j = self.candidates[leaf][best]
+        counts = self.counts[leaf][best]
+        remaining = [i for i in self.candidates[leaf] if i != j]
+        children = np.full(len(self.vocabularies[j]), -1, dtype=np.intp)
+        for code in np.flatnonzero(counts.sum(axis=1)).tolist():
+            children[code] = self.addNode(counts[code].copy(), remaining,
+                                          self.depth[leaf] + 1)
+        self.attribute[leaf] = j
+        self.children[leaf] = children
+        self.candidates[leaf] = remaining
+        self.counts[leaf] = None
+        self.rowCounts[leaf] = None
+        self.gain[leaf] = gains[best]
+
+    def tree(self, node=0, label=None):
+        # The tree as nested dicts in the format of build_tree, so predict
+        # and compile_tree work on it. Leaves without rows yet take the
+        # label of their parent
+        if self.columns is None:
+            return {'label': None, 'samples': 0}
+        classCounts = self.classCounts[node]
+        if classCounts.sum() > 0:
+            label = list(self.vocabularies[-1])[int(np.argmax(classCounts))]
+        result = {'label': label, 'samples': int(classCounts.sum())}
+        j = self.attribute[node]
+        if j < 0:
+            return result
+
+        children = self.children[node]
+        result['attribute'] = self.columns[j]
+        result['gain'] = self.gain[node]
+        result['children'] = {}
+        for value, code in self.vocabularies[j].items():
+            if code < len(children) and children[code] >= 0:
+                result['children'][value] = self.tree(int(children[code]),
+                                                      label)
+        return result
+
+    def predict(self, df):
+        return compile_tree(self.tree()).predict(df)
+
+
+def readPartition(path):
+    # Default reader of the partitioned mode: Parquet files by extension,
+    # CSV otherwise
+    if str(path).endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def partitionStatistics(path, reader):
+    return GainStatistics(reader(path))
+
+
+def partitioned_statistics(paths, n_jobs=None, reader=readPartition):
+    # Map-reduce over partition files: every file is read and counted on
+    # its own (by a process pool with n_jobs > 1, -1 for all cores) and the
+    # partial count tables are merged in the order of paths, which gives
+    # exactly the results of the concatenated frame. reader must be a
+    # picklable function of the path
+    paths = list(paths)
+    statistics = GainStatistics()
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs is None or n_jobs <= 1:
+        for path in paths:
+            statistics.merge(partitionStatistics(path, reader))
+        return statistics
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        for partial in pool.map(partitionStatistics, paths,
+                                [reader] * len(paths)):
+            statistics.merge(partial)
+    return statistics
+
+
+def get_selected_attribute_partitioned(paths, n_jobs=None,
+                                       reader=readPartition):
+    return partitioned_statistics(paths, n_jobs,
+                                  reader).selected_attribute()
+
+
+def takeRows(df, rows):
+    # The given rows of a dataframe or an EncodedDataset
+    if isinstance(df, EncodedDataset):
+        return EncodedDataset([codes[rows] for codes in df.codes],
+                              df.vocabularies, df.columns)
+    return df.iloc[rows]
+
+
+class EntropyCache:
+    # LRU cache of the entropy functions of one dataset, keyed by a
+    # fingerprint of the row subset and the attribute. The fingerprint is a
+    # blake2b digest of the sorted row indices, so the same rows in another
+    # order (e.g. after growTree partitions its order array) share an entry
+    # as the entropies do not depend on the order of the rows. It costs far
+    # less than the counting it saves. Entries are evicted, least recently
+    # used first, once their estimated size goes over max_bytes
+    def __init__(self, df, max_bytes=64 * 1024 * 1024):
+        self.df = df
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, rows):
+        if rows is None:
+            return None
+        rows = np.sort(np.asarray(rows, dtype=np.int64))
+        return (len(rows), hashlib.blake2b(rows.tobytes(),
+                                           digest_size=16).digest())
+
+    def lookup(self, key, compute):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        self.misses += 1
+        value = compute()
+        size = sys.getsizeof(key) + sys.getsizeof(value) + \
+            sum(sys.getsizeof(part) for part in key)
+        if size <= self.max_bytes:
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= evicted
+        return value
+
+    def subset(self, rows):
+        return self.df if rows is None else takeRows(self.df, rows)
+
+    def datasetEntropy(self, rows, fingerprint):
+        return self.lookup(('dataset', fingerprint),
+                           lambda: get_entropy_of_dataset(self.subset(rows)))
+
+    def attributeEntropy(self, attribute, rows, fingerprint):
+        return self.lookup(('attribute', fingerprint, attribute),
+                           lambda: get_entropy_of_attribute(
+                               self.subset(rows), attribute))
+
+    def get_entropy_of_dataset(self, rows=None):
+        return self.datasetEntropy(rows, self.fingerprint(rows))
+
+    def get_entropy_of_attribute(self, attribute, rows=None):
+        return self.attributeEntropy(attribute, rows, self.fingerprint(rows))
+
+    def get_information_gain(self, attribute, rows=None):
+        fingerprint = self.fingerprint(rows)
+        return abs(self.datasetEntropy(rows, fingerprint) -
+                   self.attributeEntropy(attribute, rows, fingerprint))
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self.entries), 'bytes': self.nbytes,
+                'max_bytes': self.max_bytes}
+
+
+def cross_validate_selection(df, k=5, random_state=None):
+    # k-fold cross-validation of get_selected_attribute. The rows are
+    # shuffled into k folds and every attribute needs a single counting
+    # pass that yields the attribute x target table of each fold at once;
+    # the table of a training set is the total minus the held out fold's.
+    # Returns one (information_gains, selected_column) per fold, with the
+    # gains of the batched mode on the training rows
+    codes, vocabularies = encodeDataframe(df)
+    cols = df.columns
+    numberOfRows = df.shape[0]
+    numberOfTargetValues = len(vocabularies[-1])
+    targetCodes = codes[-1]
+
+    rng = np.random.default_rng(random_state)
+    fold = np.empty(numberOfRows, dtype=np.intp)
+    fold[rng.permutation(numberOfRows)] = np.arange(numberOfRows) % k
+    foldSizes = np.bincount(fold, minlength=k)
+
+    # Fold x target counts, the last column counting missing targets
+    foldTargetCounts = np.bincount(
+        fold * (numberOfTargetValues + 1) + targetCodes,
+        minlength=k * (numberOfTargetValues + 1)).reshape(k, -1)
+    trainingTargetCounts = foldTargetCounts.sum(axis=0) - foldTargetCounts
+
+    foldTables = []
+    totalTables = []
+    for i in range(len(cols)-1):
+        numberOfAttributeValues = len(vocabularies[i])
+        size = (numberOfAttributeValues + 1) * (numberOfTargetValues + 1)
+        flat = fold * size + codes[i].astype(np.intp) * \
+            (numberOfTargetValues + 1) + targetCodes
+        tables = np.bincount(flat, minlength=k * size).reshape(
+            k, numberOfAttributeValues + 1, numberOfTargetValues + 1)
+        foldTables.append(tables[:, :numberOfAttributeValues,
+                                 :numberOfTargetValues])
+        totalTables.append(foldTables[-1].sum(axis=0))
+
+    results = []
+    for f in range(k):
+        trainingSize = numberOfRows - foldSizes[f]
+        entropy_of_dataset = entropyOfCounts(
+            trainingTargetCounts[f, :numberOfTargetValues])
+
+        information_gains = {}
+        selected_column = ''
+        max_col = float('-inf')
+        for i in range(len(cols)-1):
+            counts = totalTables[i] - foldTables[i][f]
+            information_gains[cols[i]] = abs(
+                entropy_of_dataset - conditionalEntropy(counts, trainingSize))
+            if(max_col < information_gains[cols[i]]):
+                max_col = information_gains[cols[i]]
+                selected_column = cols[i]
+
+        results.append((information_gains, selected_column))
+
+    return results
+
+
+def codesEntropy(flat, size):
+    # Entropy of the distribution of integer codes in [0, size). Sparse
+    # combinations of high cardinality columns are counted with unique
+    # instead of a mostly empty bincount
+    if size <= 4 * len(flat) + 1024:
+        counts = np.bincount(flat, minlength=size)
+    else:
+        counts = np.unique(flat, return_counts=True)[1]
+    return float(rowEntropies(counts)[0])
+
+
+def mutual_information_matrix(df, conditional=False, n_threads=None):
+    # Symmetric matrix of the mutual information I(A;B) of every pair of
+    # attributes, or with conditional=True of I(A;B|target), as a dataframe.
+    # The frame is encoded once and every pair is one joint count of the
+    # combined codes: I(A;B) = H(A) + H(B) - H(A,B) and
+    # I(A;B|Y) = H(A,Y) + H(B,Y) - H(A,B,Y) - H(Y). Rows with a missing
+    # value in one of the columns involved are left out of that pair. The
+    # pairs are independent and are spread over n_threads threads
+    codes, vocabularies = encodeDataframe(df)
+    attributes = df.columns[:-1].tolist()
+    numberOfTargetValues = len(vocabularies[-1])
+    targetCodes = codes[-1].astype(np.intp)
+
+    def information(i, j):
+        a = codes[i].astype(np.intp)
+        b = codes[j].astype(np.intp)
+        nA = len(vocabularies[i])
+        nB = len(vocabularies[j])
+        valid = (a < nA) & (b < nB)
+        if conditional:
+            valid &= targetCodes < numberOfTargetValues
+        a = a[valid]
+        b = b[valid]
+        if not conditional:
+            return codesEntropy(a, nA) + codesEntropy(b, nB) - \
+                codesEntropy(a * nB + b, nA * nB)
+        t = targetCodes[valid]
+        nT = numberOfTargetValues
+        return codesEntropy(a * nT + t, nA * nT) + \
+            codesEntropy(b * nT + t, nB * nT) - \
+            codesEntropy((a * nB + b) * nT + t, nA * nB * nT) - \
+            codesEntropy(t, nT)
+
+    pairs = [(i, j) for i in range(len(attributes))
+             for j in range(i, len(attributes))]
+    if n_threads is None or n_threads <= 1:
+        values = [information(i, j) for i, j in pairs]
+    else:
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            values = list(pool.map(lambda pair: information(*pair), pairs))
+
+    matrix = np.zeros((len(attributes), len(attributes)))
+    for (i, j), value in zip(pairs, values):
+        # Rounding can leave tiny negative values for independent columns
+        matrix[i, j] = matrix[j, i] = max(value, 0.0)
+    return pd.DataFrame(matrix, index=attributes, columns=attributes)